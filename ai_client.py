@@ -1,12 +1,12 @@
-import os
 from dotenv import load_dotenv
-from openai import OpenAI
+
+from services.admission import admission
+from services.provider_clients import provider_clients
 
 load_dotenv()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 
-def generate_fitness_plan(data: dict) -> dict:
+async def generate_fitness_plan(data: dict) -> dict:
     """Generate fitness plan using OpenAI based on user inputs."""
     prompt = f"""Create a personalized fitness plan for:
 - Age: {data.get('age', 'N/A')}
@@ -21,13 +21,14 @@ Return a JSON object with exactly these keys:
 - tips: string (general fitness tips)
 """
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are a fitness coach. Return only valid JSON."},
-                {"role": "user", "content": prompt}
-            ]
-        )
+        async with admission.slot("openai"):
+            response = await provider_clients.openai.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "You are a fitness coach. Return only valid JSON."},
+                    {"role": "user", "content": prompt}
+                ]
+            )
         import json
         content = response.choices[0].message.content
         result = json.loads(content) if isinstance(content, str) else content
@@ -22,21 +22,49 @@
 
 
 
-import os
-import anthropic
 from dotenv import load_dotenv
 
+from services.admission import admission
+from services.metrics import record_usage, track_upstream
+from services.provider_clients import provider_clients
+from services.response_cache import response_cache
+from services.single_flight import flight_key, single_flight
+
 load_dotenv()  # load .env file if present
 
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
 
-def ask_claude(prompt: str, model: str = "claude-3-opus-20240229") -> str:
+CLAUDE_MODEL = "claude-3-opus-20240229"
+
+
+async def ask_claude(prompt: str, model: str = CLAUDE_MODEL) -> str:
     """Send a message to Claude and return its response."""
-    response = client.messages.create(
+    messages = [{"role": "user", "content": prompt}]
+    params = {"max_tokens": 200}
+    cached = await response_cache.aget("anthropic", model, messages, params)
+    if cached is not None:
+        return cached
+
+    async def _call():
+        async with admission.slot("anthropic"):
+            with track_upstream("anthropic", model):
+                response = await provider_clients.anthropic.messages.create(model=model, messages=messages, **params)
+        record_usage("anthropic", model, response.usage.input_tokens, response.usage.output_tokens)
+        text = response.content[0].text
+        await response_cache.aset("anthropic", model, messages, text, params)
+        return text
+
+    return await single_flight.do(flight_key("anthropic", model, messages, params), _call)
+
+
+async def stream_claude(prompt: str, model: str = CLAUDE_MODEL, max_tokens: int = 1024, usage: dict | None = None):
+    """Stream Claude's reply as text deltas. Token usage is written into `usage` when the stream ends."""
+    async with provider_clients.anthropic.messages.stream(
         model=model,
-        max_tokens=200,
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
-    )
-    return response.content[0].text
+        max_tokens=max_tokens,
+        messages=[{"role": "user", "content": prompt}],
+    ) as stream:
+        async for text in stream.text_stream:
+            yield text
+        final = await stream.get_final_message()
+    if usage is not None:
+        usage.update(model=model, input_tokens=final.usage.input_tokens, output_tokens=final.usage.output_tokens)
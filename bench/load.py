@@ -0,0 +1,339 @@
+# bench/load.py
+# Load driver for main.py. For each scenario (endpoint) and concurrency level it
+# keeps N requests in flight for a fixed duration and reports RPS, p50/p95/p99
+# latency, time to first token/byte for streaming endpoints, error counts and
+# the app's memory (RSS, read from /proc when the app is spawned by this script).
+# Results are saved as JSON; --compare flags regressions against an earlier run.
+#
+# Typical run (starts the mock providers and the app with env pointing at them):
+#   python -m bench.load --spawn --concurrency 1,8,32 --duration 15
+# Against an already running app (e.g. configured by hand):
+#   python -m bench.load --app-url http://127.0.0.1:8000 --mock-url http://127.0.0.1:9100
+# Compare with a baseline:
+#   python -m bench.load --spawn --compare bench/results/20250101T120000Z.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "bench", "results")
+
+
+def minimal_pdf(text: str) -> bytes:
+    """A one-page PDF with the given text (ASCII), built by hand so no PDF library is needed."""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("ascii")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+@dataclass
+class Scenario:
+    name: str
+    path: str
+    request: Callable[[str, int], dict]  # (unique text, request number) -> httpx request kwargs
+    stream: str | None = None  # "sse" (first content event) | "bytes" (first body bytes) | None
+
+
+def build_scenarios(mock_url: str) -> list[Scenario]:
+    audio = b"\x1a\x45\xdf\xa3" + os.urandom(4096)  # webm magic + noise; the mock STT ignores content
+    pdf_text = "Latency budgets and tail percentiles for streaming APIs."
+    return [
+        Scenario("chat", "/chat", lambda text, i: {"json": {"message": text}}),
+        Scenario("chat_stream", "/chat/stream", lambda text, i: {"json": {"message": text}}, stream="sse"),
+        Scenario("claude", "/claude", lambda text, i: {"json": {"prompt": text}}),
+        Scenario("claude_stream", "/claude/stream", lambda text, i: {"json": {"prompt": text}}, stream="sse"),
+        Scenario("gemini", "/gemini", lambda text, i: {"json": {"message": text}}),
+        Scenario("gemini_stream", "/gemini/stream", lambda text, i: {"json": {"message": text}}, stream="sse"),
+        Scenario("perplexity", "/perplexity", lambda text, i: {"json": {"message": text}}),
+        Scenario("perplexity_stream", "/perplexity/stream", lambda text, i: {"json": {"message": text}}, stream="sse"),
+        Scenario("image", "/generate-image", lambda text, i: {"json": {"prompt": text}}),
+        Scenario("query", "/query", lambda text, i: {"json": {"query": text}}),
+        Scenario("scrape", "/scrape-multiple", lambda text, i: {"json": {"urls": [f"{mock_url}/site/{i * 5 + k}.html" for k in range(5)]}}),
+        Scenario("voice", "/voice-chatbot", lambda text, i: {"files": {"audio": ("bench.webm", audio, "audio/webm")}}),
+        Scenario("voice_stream", "/voice-chatbot/stream", lambda text, i: {"files": {"audio": ("bench.webm", audio, "audio/webm")}}, stream="bytes"),
+        Scenario("upload", "/upload", lambda text, i: {"files": {"file": (f"bench-{i}.pdf", minimal_pdf(f"{pdf_text} {text}"), "application/pdf")}}),
+    ]
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return round(ordered[index], 1)
+
+
+def read_memory(pid: int | None) -> dict:
+    """Current and peak RSS in MiB for pid, from /proc (Linux only)."""
+    if pid is None:
+        return {}
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return {}
+    to_mib = lambda key: round(int(fields[key].split()[0]) / 1024, 1) if key in fields else None
+    return {"rss_mib": to_mib("VmRSS"), "peak_rss_mib": to_mib("VmHWM")}
+
+
+async def _one_request(client: httpx.AsyncClient, scenario: Scenario, text: str, number: int) -> tuple[int, float, float | None]:
+    """Returns (status, latency_ms, ttft_ms)."""
+    start = time.perf_counter()
+    ttft = None
+    kwargs = scenario.request(text, number)
+    if scenario.stream is None:
+        response = await client.post(scenario.path, **kwargs)
+        await response.aread()
+        return response.status_code, (time.perf_counter() - start) * 1000, None
+    async with client.stream("POST", scenario.path, **kwargs) as response:
+        if scenario.stream == "sse":
+            async for line in response.aiter_lines():
+                if ttft is None and line.startswith("data:") and '"content"' in line:
+                    ttft = (time.perf_counter() - start) * 1000
+        else:
+            async for chunk in response.aiter_bytes():
+                if ttft is None and chunk:
+                    ttft = (time.perf_counter() - start) * 1000
+        return response.status_code, (time.perf_counter() - start) * 1000, ttft
+
+
+async def run_level(app_url: str, scenario: Scenario, concurrency: int, duration: float, repeat_prompts: bool, app_pid: int | None, timeout: float) -> dict:
+    latencies, ttfts, statuses = [], [], {}
+    counter = iter(range(10**9))
+    run_id = uuid.uuid4().hex[:8]
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        while time.perf_counter() < deadline:
+            number = next(counter)
+            # Unique prompts by default so the response cache and single-flight do not hide upstream cost
+            text = f"Benchmark {scenario.name} prompt" if repeat_prompts else f"Benchmark {scenario.name} prompt {run_id}-{number}"
+            try:
+                status, latency, ttft = await _one_request(client, scenario, text, number)
+            except httpx.HTTPError as e:
+                status, latency, ttft = type(e).__name__, None, None
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if isinstance(status, int) and status < 400:
+                latencies.append(latency)
+                if ttft is not None:
+                    ttfts.append(ttft)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=app_url, timeout=timeout, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    total = sum(statuses.values())
+    return {
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(latencies),
+        "errors": total - len(latencies),
+        "statuses": statuses,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {"p50": percentile(latencies, 0.50), "p95": percentile(latencies, 0.95), "p99": percentile(latencies, 0.99)},
+        "ttft_ms": {"p50": percentile(ttfts, 0.50), "p95": percentile(ttfts, 0.95), "p99": percentile(ttfts, 0.99)} if scenario.stream else None,
+        "memory": read_memory(app_pid),
+    }
+
+
+def _wait_until_up(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def _wait_until_ready(app_url: str, timeout: float):
+    """
+    Poll /ready until every subsystem has started. The app answers other routes
+    while the RAG index is still loading, and the query scenario would count
+    those warm-up 503s as errors.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = httpx.get(f"{app_url}/ready", timeout=2)
+            if response.status_code == 200:
+                return
+            failed = {name: s["error"] for name, s in response.json()["subsystems"].items() if s["status"] == "failed"}
+            if failed:
+                raise RuntimeError(f"{app_url} failed to start: {failed}")
+        except (httpx.HTTPError, ValueError, KeyError):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{app_url}/ready did not return 200 within {timeout:.0f}s")
+
+
+def spawn(args) -> tuple[list[subprocess.Popen], int]:
+    """Start the mock providers and the app (pointed at them); returns (processes, app_pid)."""
+    mock_port = args.mock_url.rsplit(":", 1)[1]
+    profile = ["--first-token-ms", str(args.first_token_ms), "--tokens-per-sec", str(args.tokens_per_sec), "--reply-tokens", str(args.reply_tokens)]
+    mock = subprocess.Popen([sys.executable, "-m", "bench.mock_providers", "--port", mock_port, *profile], cwd=ROOT)
+    _wait_until_up(f"{args.mock_url}/site/0.html", 30)
+
+    state_dir = tempfile.mkdtemp(prefix="bench-state-")
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": f"{args.mock_url}/v1", "OPENAI_API_BASE": f"{args.mock_url}/v1",
+        "ANTHROPIC_API_KEY": "bench", "ANTHROPIC_BASE_URL": args.mock_url,
+        "GEMINI_API_KEY": "bench", "GEMINI_BASE_URL": f"{args.mock_url}/v1beta",
+        "PERPLEXITY_API_KEY": "bench", "PERPLEXITY_BASE_URL": f"{args.mock_url}/v1",
+        # Fresh caches and stores per run, and no politeness delay against the single mock host
+        "LLAMA_STORAGE_DIR": os.path.join(state_dir, "storage"),
+        "UPLOAD_CACHE_DIR": os.path.join(state_dir, "uploads"),
+        "HTTP_CACHE_DIR": os.path.join(state_dir, "http"),
+        "EXTRACTION_CACHE_DIR": os.path.join(state_dir, "extractions"),
+        "GRAPH_STORE_PATH": os.path.join(state_dir, "concept_graph.json"),
+        "JOBS_DIR": os.path.join(state_dir, "jobs"),
+        "SCRAPE_PER_HOST_INTERVAL": "0",
+        "SCRAPE_PER_HOST_CONCURRENCY": "100",
+    }
+    app_port = args.app_url.rsplit(":", 1)[1]
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", app_port, "--log-level", "warning"], cwd=ROOT, env=env)
+    return [app, mock], app.pid
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline_path: str, threshold: float) -> list[str]:
+    """Lines describing p95 latency / RPS regressions beyond threshold (fraction) vs. the baseline run."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = baseline.get((result["scenario"], result["concurrency"]))
+        if not before:
+            continue
+        label = f"{result['scenario']} @ c={result['concurrency']}"
+        old_p95, new_p95 = before["latency_ms"]["p95"], result["latency_ms"]["p95"]
+        if old_p95 and new_p95 and new_p95 > old_p95 * (1 + threshold):
+            regressions.append(f"{label}: p95 {old_p95} -> {new_p95} ms")
+        if before["rps"] and result["rps"] < before["rps"] * (1 - threshold):
+            regressions.append(f"{label}: rps {before['rps']} -> {result['rps']}")
+        if result["errors"] > before["errors"]:
+            regressions.append(f"{label}: errors {before['errors']} -> {result['errors']}")
+    return regressions
+
+
+def print_result(result: dict):
+    latency, ttft = result["latency_ms"], result["ttft_ms"] or {}
+    memory = result["memory"].get("rss_mib")
+    print(
+        f"{result['scenario']:<18} c={result['concurrency']:<4} rps={result['rps']:<8} "
+        f"p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} ms"
+        + (f"  ttft p50={ttft.get('p50')} p95={ttft.get('p95')} ms" if ttft else "")
+        + f"  errors={result['errors']}"
+        + (f"  rss={memory} MiB" if memory else "")
+    )
+
+
+async def run(args) -> dict:
+    processes, app_pid = spawn(args) if args.spawn else ([], args.app_pid)
+    try:
+        # Spawned or not, no scenario starts against a half-loaded app
+        _wait_until_ready(args.app_url, args.startup_timeout)
+        scenarios = build_scenarios(args.mock_url)
+        if args.scenarios:
+            wanted = set(args.scenarios.split(","))
+            scenarios = [s for s in scenarios if s.name in wanted]
+        results = []
+        for scenario in scenarios:
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                result = await run_level(args.app_url, scenario, concurrency, args.duration, args.repeat_prompts, app_pid, args.timeout)
+                print_result(result)
+                results.append(result)
+        return {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "settings": {
+                "duration": args.duration, "concurrency": args.concurrency, "repeat_prompts": args.repeat_prompts,
+                "first_token_ms": args.first_token_ms, "tokens_per_sec": args.tokens_per_sec, "reply_tokens": args.reply_tokens,
+            },
+            "results": results,
+        }
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test main.py endpoints against local mock providers")
+    parser.add_argument("--app-url", default="http://127.0.0.1:8100")
+    parser.add_argument("--mock-url", default="http://127.0.0.1:9100")
+    parser.add_argument("--spawn", action="store_true", help="start the mock providers and the app for this run")
+    parser.add_argument("--app-pid", type=int, help="pid of an already running app, for memory readings")
+    parser.add_argument("--scenarios", help="comma-separated subset, e.g. chat,chat_stream,scrape")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per scenario and level")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout")
+    parser.add_argument("--repeat-prompts", action="store_true", help="send identical prompts (exercises caching/coalescing)")
+    parser.add_argument("--first-token-ms", type=float, default=300.0)
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--output", help="results file (default bench/results/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression tolerance as a fraction")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
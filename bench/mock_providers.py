@@ -0,0 +1,272 @@
+# bench/mock_providers.py
+# Local stand-ins for the upstream APIs the app calls, so main.py can be load
+# tested without spending money or hitting provider rate limits:
+#   - OpenAI-compatible: chat completions (plain + streaming), images,
+#     audio transcription/speech, embeddings (also serves Perplexity)
+#   - Anthropic messages (plain + streaming)
+#   - Gemini generateContent / streamGenerateContent (alt=sse)
+#   - a static HTML site for the scraper (/site/<n>.html)
+#
+# Latency profile (env vars, or flags when run directly):
+#   MOCK_FIRST_TOKEN_MS  delay before the first token / the full reply (default 300)
+#   MOCK_TOKENS_PER_SEC  streaming rate after the first token (default 50)
+#   MOCK_REPLY_TOKENS    tokens per reply (default 60)
+#   MOCK_JITTER          +/- fraction applied to every delay (default 0.2)
+#   MOCK_IMAGE_MS, MOCK_AUDIO_MS  fixed delays for image and audio calls
+#
+# Run: python -m bench.mock_providers --port 9100 --first-token-ms 500
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+
+PROFILE = {
+    "first_token_ms": float(os.getenv("MOCK_FIRST_TOKEN_MS", "300")),
+    "tokens_per_sec": float(os.getenv("MOCK_TOKENS_PER_SEC", "50")),
+    "reply_tokens": int(os.getenv("MOCK_REPLY_TOKENS", "60")),
+    "jitter": float(os.getenv("MOCK_JITTER", "0.2")),
+    "image_ms": float(os.getenv("MOCK_IMAGE_MS", "2000")),
+    "audio_ms": float(os.getenv("MOCK_AUDIO_MS", "400")),
+}
+
+WORDS = (
+    "the quick brown fox jumps over a lazy dog while latency budgets shrink and "
+    "tokens stream steadily through pooled connections to waiting clients"
+).split()
+EMBEDDING_DIM = 1536
+# 1x1 transparent PNG
+PNG_B64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+# A few valid-looking MPEG frame headers' worth of bytes; clients only pass them through
+MP3_CHUNK = b"\xff\xfb\x90\x64" + b"\x00" * 413
+
+app = FastAPI(title="Mock providers")
+
+
+def _jittered(ms: float) -> float:
+    spread = PROFILE["jitter"]
+    return max(0.0, ms * (1 + random.uniform(-spread, spread))) / 1000
+
+
+def _tokens(seed: str) -> list[str]:
+    rng = random.Random(seed)
+    words = [rng.choice(WORDS) for _ in range(PROFILE["reply_tokens"])]
+    # Sentence breaks every ~12 words so the voice pipeline has something to split on
+    return [w + ("." if i % 12 == 11 else "") + " " for i, w in enumerate(words)]
+
+
+def _prompt_tokens(payload) -> int:
+    return max(1, len(json.dumps(payload)) // 4)
+
+
+async def _stream_tokens(seed: str):
+    """Yield reply tokens: first after MOCK_FIRST_TOKEN_MS, then at MOCK_TOKENS_PER_SEC."""
+    interval = 1.0 / PROFILE["tokens_per_sec"] if PROFILE["tokens_per_sec"] > 0 else 0.0
+    await asyncio.sleep(_jittered(PROFILE["first_token_ms"]))
+    for i, token in enumerate(_tokens(seed)):
+        if i:
+            await asyncio.sleep(interval)
+        yield token
+
+
+async def _full_reply(seed: str) -> str:
+    # Non-streaming calls cost the same wall time as streaming the whole reply
+    tokens = _tokens(seed)
+    rate = PROFILE["tokens_per_sec"]
+    duration = PROFILE["first_token_ms"] + (1000 * (len(tokens) - 1) / rate if rate > 0 else 0)
+    await asyncio.sleep(_jittered(duration))
+    return "".join(tokens).strip()
+
+
+def _sse(data) -> str:
+    return f"data: {json.dumps(data)}\n\n"
+
+
+# OpenAI-compatible (OpenAI SDK base_url=http://host:port/v1, Perplexity too)
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    model = payload.get("model", "mock")
+    seed = json.dumps(payload.get("messages"), sort_keys=True)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    prompt_tokens = _prompt_tokens(payload.get("messages"))
+
+    if payload.get("stream"):
+        async def events():
+            count = 0
+            async for token in _stream_tokens(seed):
+                count += 1
+                yield _sse({
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                })
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": count, "total_tokens": prompt_tokens + count}
+            yield _sse({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage,
+            })
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    text = await _full_reply(seed)
+    completion_tokens = PROFILE["reply_tokens"]
+    return {
+        "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    payload = await request.json()
+    inputs = payload.get("input")
+    inputs = [inputs] if isinstance(inputs, str) else inputs
+    data = []
+    for index, text in enumerate(inputs):
+        # Deterministic unit vector per input, so similarity search behaves consistently
+        rng = random.Random(hashlib.sha256(str(text).encode()).digest())
+        vector = [rng.gauss(0, 1) for _ in range(EMBEDDING_DIM)]
+        norm = math.sqrt(sum(v * v for v in vector))
+        data.append({"object": "embedding", "index": index, "embedding": [v / norm for v in vector]})
+    await asyncio.sleep(_jittered(50))
+    tokens = sum(len(str(text)) // 4 + 1 for text in inputs)
+    return {"object": "list", "data": data, "model": payload.get("model", "mock"), "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+
+@app.post("/v1/images/generations")
+async def images(request: Request):
+    payload = await request.json()
+    await asyncio.sleep(_jittered(PROFILE["image_ms"]))
+    if payload.get("model") == "dall-e-3" or payload.get("response_format") == "url":
+        base = str(request.base_url).rstrip("/")
+        return {"created": int(time.time()), "data": [{"url": f"{base}/files/image.png"}]}
+    return {"created": int(time.time()), "data": [{"b64_json": PNG_B64}]}
+
+
+@app.get("/files/image.png")
+async def image_file():
+    return Response(base64.b64decode(PNG_B64), media_type="image/png")
+
+
+@app.post("/v1/audio/transcriptions")
+async def transcriptions(request: Request):
+    await request.body()
+    await asyncio.sleep(_jittered(PROFILE["audio_ms"]))
+    return {"text": "What is a good way to measure tail latency for a streaming API?"}
+
+
+@app.post("/v1/audio/speech")
+async def speech(request: Request):
+    payload = await request.json()
+    await asyncio.sleep(_jittered(PROFILE["audio_ms"]))
+    # Roughly proportional to the text length, like real TTS output
+    return Response(MP3_CHUNK * max(1, len(payload.get("input", "")) // 10), media_type="audio/mpeg")
+
+
+# Anthropic (ANTHROPIC_BASE_URL=http://host:port)
+@app.post("/v1/messages")
+async def anthropic_messages(request: Request):
+    payload = await request.json()
+    model = payload.get("model", "mock")
+    seed = json.dumps(payload.get("messages"), sort_keys=True)
+    message_id = f"msg_{uuid.uuid4().hex[:12]}"
+    input_tokens = _prompt_tokens(payload.get("messages"))
+
+    if payload.get("stream"):
+        async def events():
+            def event(name, data):
+                return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+            yield event("message_start", {"type": "message_start", "message": {
+                "id": message_id, "type": "message", "role": "assistant", "content": [], "model": model,
+                "stop_reason": None, "stop_sequence": None, "usage": {"input_tokens": input_tokens, "output_tokens": 1},
+            }})
+            yield event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+            count = 0
+            async for token in _stream_tokens(seed):
+                count += 1
+                yield event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": token}})
+            yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": count}})
+            yield event("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    text = await _full_reply(seed)
+    return {
+        "id": message_id, "type": "message", "role": "assistant", "model": model,
+        "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": {"input_tokens": input_tokens, "output_tokens": PROFILE["reply_tokens"]},
+    }
+
+
+# Gemini (GEMINI_BASE_URL=http://host:port/v1beta)
+def _gemini_chunk(text: str, prompt_tokens: int, output_tokens: int) -> dict:
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens, "totalTokenCount": prompt_tokens + output_tokens},
+    }
+
+
+@app.post("/v1beta/models/{model_action}")
+async def gemini(model_action: str, request: Request):
+    model, _, action = model_action.partition(":")
+    payload = await request.json()
+    seed = json.dumps(payload.get("contents"), sort_keys=True)
+    prompt_tokens = _prompt_tokens(payload.get("contents"))
+
+    if action == "streamGenerateContent":
+        async def events():
+            count = 0
+            async for token in _stream_tokens(seed):
+                count += 1
+                yield _sse(_gemini_chunk(token, prompt_tokens, count))
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+    if action == "generateContent":
+        return _gemini_chunk(await _full_reply(seed), prompt_tokens, PROFILE["reply_tokens"])
+    return JSONResponse({"error": {"code": 404, "message": f"models/{model} action {action} not found"}}, status_code=404)
+
+
+# Static site for /scrape-multiple
+@app.get("/site/{page}.html", response_class=HTMLResponse)
+async def site_page(page: int):
+    await asyncio.sleep(_jittered(30))
+    paragraphs = "\n".join(
+        f"<p>{' '.join(random.Random(page * 100 + i).choice(WORDS) for _ in range(40))}.</p>" for i in range(20)
+    )
+    rows = "".join(f"<tr><td>Item {i}</td><td>{i * page}</td></tr>" for i in range(10))
+    return f"""<!doctype html><html><head><title>Mock page {page}</title></head><body>
+<nav><a href="/site/{page + 1}.html">Next</a></nav>
+<main><h1>Mock page {page}</h1>{paragraphs}
+<h2>Table</h2><table><tr><th>Name</th><th>Value</th></tr>{rows}</table>
+<p>Contact: <a href="mailto:bench{page}@example.com">bench{page}@example.com</a></p></main>
+<footer>Footer links and boilerplate</footer></body></html>"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock LLM/image/audio providers and a static site")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    for key, value in PROFILE.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+    for key in PROFILE:
+        PROFILE[key] = getattr(args, key)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
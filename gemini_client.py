@@ -0,0 +1,151 @@
+# Gemini REST client (no SDK dependency, more reliable)
+# Uses the shared pooled HTTP client from services.provider_clients.
+
+import json
+import os
+from functools import partial
+from dotenv import load_dotenv
+
+from services.admission import admission
+from services.metrics import record_usage
+from services.provider_clients import provider_clients
+from services.provider_router import AllCandidatesFailed, Candidate, provider_router
+from services.response_cache import response_cache
+from services.single_flight import flight_key, single_flight
+
+load_dotenv()
+
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+# Tried in order; a model that 404s for this key falls through to the next
+GEMINI_MODELS = ["gemini-2.0-flash", "gemini-2.5-flash", "gemini-pro"]
+
+
+class GeminiError(Exception):
+    """Upstream Gemini failure carrying the HTTP status to return to the caller."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def get_gemini_api_key() -> str | None:
+    return os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+
+
+def _payload(message: str) -> dict:
+    return {
+        "contents": [{"parts": [{"text": message}]}],
+        "generationConfig": {"temperature": 0.7, "maxOutputTokens": 1024}
+    }
+
+
+def _raise_for_gemini_error(status_code: int, body: str):
+    if status_code == 429 or "quota" in body.lower() or "RESOURCE_EXHAUSTED" in body:
+        raise GeminiError(429, "Gemini API quota exceeded. Wait a few minutes or check https://ai.google.dev/gemini-api/docs/rate-limits")
+    raise GeminiError(status_code, body[:500])
+
+
+def _is_missing_model(status_code: int, body: str) -> bool:
+    return status_code == 404 or "not found" in body.lower()
+
+
+def _candidate_text(data: dict) -> str:
+    parts = data.get("candidates", [{}])[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts)
+
+
+def _is_fatal(error: BaseException) -> bool:
+    """Bad requests fail the same way on every model; quota, missing models, 5xx and network errors fall over."""
+    return isinstance(error, GeminiError) and 400 <= error.status_code < 500 and error.status_code not in (404, 408, 429)
+
+
+async def _generate_content(model_id: str, payload: dict, api_key: str) -> str:
+    resp = await provider_clients.http.post(
+        f"{GEMINI_BASE_URL}/models/{model_id}:generateContent",
+        params={"key": api_key},
+        json=payload,
+    )
+    if resp.status_code >= 400:
+        if _is_missing_model(resp.status_code, resp.text):
+            raise GeminiError(404, resp.text[:500])
+        _raise_for_gemini_error(resp.status_code, resp.text)
+    data = resp.json()
+    metadata = data.get("usageMetadata") or {}
+    record_usage("gemini", model_id, metadata.get("promptTokenCount"), metadata.get("candidatesTokenCount"))
+    text = _candidate_text(data)
+    if not text:
+        raise GeminiError(502, f"{model_id} returned an empty response")
+    return text
+
+
+async def ask_gemini(message: str) -> str:
+    """
+    Send a message to Gemini and return the reply text. GEMINI_MODELS are tried in
+    order through the shared provider router (circuit breakers, hedging on slow calls).
+    """
+    api_key = get_gemini_api_key()
+    payload = _payload(message)
+    # Cache across the whole model fallback chain: any model's answer is a valid reply
+    cache_messages = [{"role": "user", "content": message}]
+    cached = await response_cache.aget("gemini", "auto", cache_messages, payload["generationConfig"])
+    if cached is not None:
+        return cached
+
+    candidates = [
+        Candidate(f"gemini:{model_id}", partial(_generate_content, model_id, payload, api_key))
+        for model_id in GEMINI_MODELS
+    ]
+    try:
+        async def call():
+            async with admission.slot("gemini"):
+                return await provider_router.call(candidates, is_fatal=_is_fatal)
+
+        text = await single_flight.do(flight_key("gemini", message, payload["generationConfig"]), call)
+    except AllCandidatesFailed as e:
+        # Report the most useful failure: anything other than "model not found" if there is one
+        errors = [error for _, error in e.errors]
+        error = next((x for x in reversed(errors) if isinstance(x, GeminiError) and x.status_code != 404), e.last_error)
+        if isinstance(error, GeminiError):
+            raise error
+        raise GeminiError(500, str(error) if error else "Gemini API failed")
+    await response_cache.aset("gemini", "auto", cache_messages, text, payload["generationConfig"])
+    return text
+
+
+async def stream_gemini(message: str, usage: dict | None = None):
+    """
+    Stream Gemini's reply as text deltas via streamGenerateContent (SSE).
+    Falls back to the next model only if one is missing before any text was sent.
+    Token usage is written into `usage` when the stream ends.
+    """
+    api_key = get_gemini_api_key()
+    last_error = None
+    for model_id in GEMINI_MODELS:
+        async with provider_clients.http.stream(
+            "POST",
+            f"{GEMINI_BASE_URL}/models/{model_id}:streamGenerateContent",
+            params={"alt": "sse", "key": api_key},
+            json=_payload(message),
+        ) as resp:
+            if resp.status_code >= 400:
+                last_error = (await resp.aread()).decode(errors="replace")
+                if _is_missing_model(resp.status_code, last_error):
+                    continue
+                _raise_for_gemini_error(resp.status_code, last_error)
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = json.loads(line[len("data:"):])
+                text = _candidate_text(data)
+                if text:
+                    yield text
+                if usage is not None and data.get("usageMetadata"):
+                    metadata = data["usageMetadata"]
+                    usage.update(
+                        model=model_id,
+                        input_tokens=metadata.get("promptTokenCount", 0),
+                        output_tokens=metadata.get("candidatesTokenCount", 0),
+                    )
+            return
+    raise GeminiError(500, last_error or "Gemini API failed")
@@ -2,8 +2,9 @@
 # fastapi_app/
 # ├── main.py
 # ├── llama_service.py
-# └── data/
-#     └── sample.pdf
+# ├── data/
+# │   └── sample.pdf
+# └── storage/          # persisted index + manifest (created on first run)
 
 
 # install
@@ -11,29 +12,248 @@
 
 
 # llama_service.py
-from llama_index.core import SimpleDirectoryReader, VectorStoreIndex
+from llama_index.core import (
+    SimpleDirectoryReader,
+    StorageContext,
+    VectorStoreIndex,
+    load_index_from_storage,
+)
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import QueryBundle
 from llama_index.llms.openai import OpenAI
+import asyncio
+import hashlib
+import json
 import os
+from contextlib import contextmanager
+
+from services.hybrid_retrieval import MODES, BM25Index, HybridRetriever
+from services.mmap_vector_store import MmapVectorStore
+from services.retrieval_cache import retrieval_cache
+from services.single_flight import flight_key, single_flight
+
+try:
+    import fcntl
+except ImportError:  # no flock on Windows; run a single worker there
+    fcntl = None
+
+# Bump when the way documents are parsed/embedded changes, to force a full rebuild
+MANIFEST_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+VECTOR_STORE_FILE = "vectors.mmvs"
+LOCK_FILE = ".refresh.lock"
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def _exclusive_lock(path: str):
+    """Cross-process lock so only one worker refreshes the index; the others wait, then load it."""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
 
 class LlamaService:
-    def __init__(self, data_path="data"):
+    def __init__(self, data_path="data", storage_path=None):
+        self.data_path = data_path
+        self.storage_path = storage_path or os.getenv("LLAMA_STORAGE_DIR", "storage")
+        # Async query path limits: how many RAG queries may run at once, and how long each may take
+        self.query_timeout = float(os.getenv("LLAMA_QUERY_TIMEOUT", "60"))
+        self._query_slots = asyncio.Semaphore(int(os.getenv("LLAMA_QUERY_CONCURRENCY", "4")))
+        # "mmap" keeps embeddings in one file shared by all workers; "simple" is llama_index's in-memory store.
+        # Either way each worker holds the docstore text and its BM25 postings in its own memory
+        self.vector_store_kind = os.getenv("LLAMA_VECTOR_STORE", "mmap")
+        self.vector_dtype = os.getenv("LLAMA_VECTOR_DTYPE", "float32")
+        # Retrieval: hybrid (BM25 + vectors), vector or bm25; alpha is the vector score's weight
+        self.retrieval_mode = os.getenv("LLAMA_RETRIEVAL_MODE", "hybrid")
+        self.hybrid_alpha = float(os.getenv("LLAMA_HYBRID_ALPHA", "0.5"))
+        self.similarity_top_k = int(os.getenv("LLAMA_TOP_K", "2"))
+
         print("🔄 Loading PDF documents and creating index...")
+        self.index = self._load_or_build_index()
+        self.retriever = self._build_retriever()
+        self.query_engine = RetrieverQueryEngine.from_args(self.retriever)
+        print("✅ Index ready!")
 
-        # Load all files (PDFs, text, etc.)
-        documents = SimpleDirectoryReader(data_path).load_data()
+    def _build_retriever(self) -> HybridRetriever:
+        node_ids = list(self.index.index_struct.nodes_dict.values())
+        nodes = [node for node in self.index.docstore.get_nodes(node_ids, raise_error=False) if node is not None]
+        bm25 = BM25Index([node.node_id for node in nodes], [node.get_content() for node in nodes])
+        print(f"🔎 BM25 index built over {len(bm25)} chunks")
+        retrieval_cache.set_index_version(self.index_version)
+        return HybridRetriever(
+            self.index,
+            bm25,
+            similarity_top_k=self.similarity_top_k,
+            alpha=self.hybrid_alpha,
+            mode=self.retrieval_mode,
+            cache=retrieval_cache,
+            index_version=self.index_version,
+        )
 
-        # Create the vector index
-        self.index = VectorStoreIndex.from_documents(documents)
-        self.query_engine = self.index.as_query_engine()
-        print("✅ Index ready!")
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def _manifest_path(self) -> str:
+        return os.path.join(self.storage_path, MANIFEST_FILE)
+
+    def _read_manifest(self) -> dict | None:
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != MANIFEST_VERSION:
+            return None
+        if manifest.get("vector_store") != self._vector_store_id():
+            return None  # backend or dtype changed: the persisted vectors cannot be reused
+        return manifest
+
+    def _write_manifest(self, files: dict) -> None:
+        os.makedirs(self.storage_path, exist_ok=True)
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "vector_store": self._vector_store_id(), "files": files}, f, indent=2)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _scan_data_files(self) -> dict:
+        """Map each file the reader would pick up to its content hash."""
+        input_files = SimpleDirectoryReader(self.data_path).input_files
+        return {str(path): _file_sha256(str(path)) for path in input_files}
+
+    def _index_version(self, indexed: dict) -> str:
+        """Changes whenever any indexed file or the vector backend changes; keys the retrieval cache."""
+        files = {path: entry["sha256"] for path, entry in indexed.items()}
+        payload = json.dumps([MANIFEST_VERSION, self._vector_store_id(), files], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def _vector_store_id(self) -> str:
+        return f"mmap:{self.vector_dtype}" if self.vector_store_kind == "mmap" else "simple"
+
+    def _new_vector_store(self) -> MmapVectorStore | None:
+        """None selects llama_index's default SimpleVectorStore."""
+        if self.vector_store_kind != "mmap":
+            return None
+        return MmapVectorStore(os.path.join(self.storage_path, VECTOR_STORE_FILE), dtype=self.vector_dtype)
+
+    def _load_or_build_index(self) -> VectorStoreIndex:
+        os.makedirs(self.storage_path, exist_ok=True)
+        with _exclusive_lock(os.path.join(self.storage_path, LOCK_FILE)):
+            return self._refresh_index()
+
+    def _refresh_index(self) -> VectorStoreIndex:
+        current = self._scan_data_files()
+        manifest = self._read_manifest()
+        vector_store = self._new_vector_store()
+
+        index = None
+        if manifest is not None:
+            try:
+                if vector_store is not None and not vector_store.exists:
+                    raise FileNotFoundError(vector_store.path)
+                storage_context = StorageContext.from_defaults(persist_dir=self.storage_path, vector_store=vector_store)
+                index = load_index_from_storage(storage_context)
+            except Exception as e:
+                print(f"⚠️ Could not load persisted index, rebuilding: {e}")
+                index = None
+
+        if index is None:
+            if vector_store is not None:
+                vector_store.clear()
+            index = VectorStoreIndex([], storage_context=StorageContext.from_defaults(vector_store=vector_store))
+            indexed = {}
+        else:
+            indexed = manifest["files"]
+
+        added = [path for path in current if path not in indexed]
+        changed = [path for path in current if path in indexed and indexed[path]["sha256"] != current[path]]
+        removed = [path for path in indexed if path not in current]
+
+        if not (added or changed or removed):
+            print(f"⚡ Index up to date ({len(current)} files), loaded from {self.storage_path}")
+            self.index_version = self._index_version(indexed)
+            return index
+
+        print(f"🔁 Refreshing index: {len(added)} added, {len(changed)} changed, {len(removed)} removed")
+        # Drop the manifest while the store is being mutated: a crash mid-refresh then
+        # triggers a clean rebuild on next boot instead of trusting a half-written store
+        if os.path.exists(self._manifest_path()):
+            os.remove(self._manifest_path())
+
+        for path in changed + removed:
+            for doc_id in indexed[path]["doc_ids"]:
+                index.delete_ref_doc(doc_id, delete_from_docstore=True)
+            indexed.pop(path)
+
+        for path in added + changed:
+            documents = SimpleDirectoryReader(input_files=[path]).load_data()
+            for document in documents:
+                index.insert(document)
+            indexed[path] = {"sha256": current[path], "doc_ids": [d.doc_id for d in documents]}
+
+        index.storage_context.persist(persist_dir=self.storage_path)
+        self._write_manifest(indexed)
+        self.index_version = self._index_version(indexed)
+        return index
 
     def query(self, question: str) -> str:
         """Query your indexed documents"""
         response = self.query_engine.query(question)
         return str(response)
 
+    async def aquery(self, question: str) -> str:
+        """
+        Query your indexed documents without blocking the event loop.
+        Waits for a free query slot; raises asyncio.TimeoutError if the whole
+        request (queueing included) exceeds LLAMA_QUERY_TIMEOUT seconds.
+        """
+        async def _run():
+            async with self._query_slots:
+                return str(await self.query_engine.aquery(question))
+
+        # Concurrent identical questions share one retrieval + LLM call
+        return await asyncio.wait_for(
+            single_flight.do(flight_key("rag", question), _run),
+            timeout=self.query_timeout,
+        )
+
+    async def aretrieve(self, question: str, top_k: int | None = None, mode: str | None = None) -> list[dict]:
+        """
+        Ranked chunks for question without the LLM synthesis step. bm25 mode is
+        purely local; vector and hybrid modes also embed the question.
+        """
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}, expected one of {', '.join(MODES)}")
+        hits = await asyncio.wait_for(
+            self.retriever.asearch(QueryBundle(question), top_k=top_k, mode=mode),
+            timeout=self.query_timeout,
+        )
+        return [
+            {
+                "node_id": hit["node"].node_id,
+                "score": hit["score"],
+                "vector_score": hit["vector_score"],
+                "bm25_score": hit["bm25_score"],
+                "text": hit["node"].get_content(),
+                "metadata": hit["node"].metadata,
+            }
+            for hit in hits
+        ]
+
 
 # test it
 # curl -X POST "http://127.0.0.1:8000/query" \
 #   -H "Content-Type: application/json" \
-#   -d '{"query": "Summarize the PDF content"}'
\ No newline at end of file
+#   -d '{"query": "Summarize the PDF content"}'
@@ -1,16 +1,33 @@
 import asyncio
+import base64
 import json
 import os
+import time
+from urllib.parse import quote
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware  # ✅ This is required
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 # anthropic
 from models import PromptRequest, ClaudeRequest, ClaudeResponse
-from anthropic_client import ask_claude
+from anthropic_client import ask_claude, stream_claude
 # openai
-from pydantic import BaseModel
-from openai_service import generate_text, generate_image, stream_chat
+from pydantic import BaseModel, Field
+from openai_service import agenerate_text, generate_image, generate_video, stream_chat
+from services.response_cache import response_cache
+from services.provider_clients import provider_clients
+from services.provider_router import provider_router
+from services.single_flight import flight_key, single_flight
+from services.voice_pipeline import speak, synthesize, transcribe
+from services.admission import admission
+from services.readiness import readiness
+from services.retrieval_cache import retrieval_cache
+from services.jobs import PRIORITY_NORMAL, QueueFull, job_queue
+from services.metrics import MetricsMiddleware, observe_upstream, record_usage, registry as metrics_registry, stream_ttft
+from gemini_client import ask_gemini, stream_gemini, get_gemini_api_key, GeminiError
+from perplexity_client import ask_perplexity, stream_perplexity, get_perplexity_api_key
 
 # numpy
 # from numpy_service import array_sum, array_mean, dot_product
@@ -18,8 +35,7 @@ from openai_service import generate_text, generate_image, stream_chat
 #pandas
 # from pandas_service import create_dataframe, calculate_column_mean, filter_by_condition
 
-# llama
-from llama_service import LlamaService
+# llama (imported lazily by the background warm-up, see _load_llama_service)
 
 
 # fitness api
@@ -27,15 +43,38 @@ from schemas import FitnessRequest, FitnessResponse
 from ai_client import generate_fitness_plan
 
 # Smart Research Assistant
-import shutil
-from services.document_processing import process_document
+import hashlib
+import tempfile
+from services.document_processing import document_cache, process_document_cached, shutdown_pdf_pool
 from services.graph_service import generate_concept_graph
+from services.graph_store import concept_graph_store
 
 #web-scrape
-from web_scrape import scrape_multiple_urls
+from web_scrape import scrape_multiple_urls, scrape_urls_stream, extraction_cache
+from services.browser_pool import browser_pool
+from services.http_fetcher import fetcher
 
 # common code
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Slow startup work (SDK imports, RAG index) runs in the background so the
+    # server listens right away; /ready reports progress per subsystem.
+    # Shared, pooled provider clients live for the whole worker lifetime
+    readiness.start("providers", provider_clients.startup())
+    readiness.start_in_thread("rag", _load_llama_service)
+    await job_queue.start()
+    try:
+        yield
+    finally:
+        await readiness.stop()
+        await job_queue.stop()
+        await provider_clients.aclose()
+        await browser_pool.close()
+        await fetcher.aclose()
+        shutdown_pdf_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 # ✅ Allowed origins (Angular local + deployed frontend)
@@ -52,6 +91,8 @@ app.add_middleware(
     allow_methods=["GET", "POST"],      # allowed HTTP methods
     allow_headers=["Content-Type", "Authorization"],  # allowed headers
 )
+# Per-route latency/status/in-flight metrics, exposed at /metrics
+app.add_middleware(MetricsMiddleware)
 
 
  # Render provides this env var
@@ -59,6 +100,13 @@ app.add_middleware(
 def read_root():
     return {"message": "Hello from FastAPI on Render!"}
 
+
+# Readiness probe: 200 once every background-started subsystem is up, 503 (with details) before
+@app.get("/ready")
+async def ready():
+    snapshot = readiness.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot["ready"] else 503)
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000)) 
     uvicorn.run(app, host="127.0.0.1", port=port)
@@ -92,6 +140,86 @@ def greet_user(name: str, greeting: str = "Hello"):
 
 
 
+# Server-Sent Events helper shared by the streaming endpoints
+async def _sse_response(stream_factory, provider: str, final_event: bool = True, flight: str | None = None):
+    """
+    Wrap a token stream as Server-Sent Events: one {"content": ...} event per chunk,
+    {"error": ...} on failure and, if final_event, a closing
+    {"done": true, "usage": {...}, "timing": {...}} event.
+    stream_factory(usage) must return an async iterator of text chunks and may fill `usage`.
+    With a flight key, identical concurrent requests share one upstream stream.
+    The upstream stream holds a provider admission slot from its first to its last
+    chunk, however many requests read it. A request that will start a new stream
+    takes the slot up front, so it fails fast with 429/503 before any event is sent;
+    joining a running stream needs no slot.
+    """
+    source = stream_factory
+    admitted = None
+    if flight is None or not single_flight.streaming(flight):
+        admitted = await admission.acquire(provider)
+
+    async def release_unclaimed():
+        # The slot taken up front, if no upstream stream has claimed it
+        nonlocal admitted
+        release, admitted = admitted, None
+        if release is not None:
+            await release()
+
+    async def upstream(usage):
+        # Runs once per upstream stream (in the shared pump, not per coalesced subscriber),
+        # so the slot and the token counts belong to the stream, not to one response
+        nonlocal admitted
+        release, admitted = admitted, None
+        if release is None:
+            # The stream this request meant to join ended before it subscribed
+            release = await admission.acquire(provider)
+        start, ok = time.perf_counter(), False
+        try:
+            async for chunk in source(usage):
+                yield chunk
+            ok = True
+        finally:
+            await release()
+            observe_upstream(f"{provider}:{usage.get('model') or 'stream'}", time.perf_counter() - start, ok)
+        record_usage(provider, usage.get("model"), usage.get("input_tokens"), usage.get("output_tokens"))
+
+    stream_factory = upstream
+    if flight is not None:
+        stream_factory = lambda usage: single_flight.stream(flight, upstream, usage)
+
+    async def generate():
+        usage = {}
+        start = time.perf_counter()
+        first_token_ms = None
+        stream = stream_factory(usage)
+        try:
+            async for chunk in stream:
+                if first_token_ms is None:
+                    # An upstream started for this request has claimed the slot by now;
+                    # if it is still unclaimed, another request's stream was joined instead
+                    await release_unclaimed()
+                    first_token_ms = round((time.perf_counter() - start) * 1000, 1)
+                    stream_ttft.observe(first_token_ms / 1000, provider)
+                yield f"data: {json.dumps({'content': chunk})}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            return
+        finally:
+            await release_unclaimed()
+            await stream.aclose()
+        if final_event:
+            timing = {"ttft_ms": first_token_ms, "total_ms": round((time.perf_counter() - start) * 1000, 1)}
+            yield f"data: {json.dumps({'done': True, 'usage': usage, 'timing': timing})}\n\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Covers a body that never started (client gone before the first chunk)
+        background=BackgroundTask(release_unclaimed),
+    )
+
+
 # anthropic function (accepts both prompt and message for frontend compatibility)
 @app.post("/claude", response_model=ClaudeResponse)
 async def ask_claude_api(request: ClaudeRequest):
@@ -99,19 +227,27 @@ async def ask_claude_api(request: ClaudeRequest):
         text = request.get_text()
         if not text:
             raise HTTPException(status_code=400, detail="Either 'prompt' or 'message' is required")
-        result = ask_claude(text)
+        result = await ask_claude(text)
         return ClaudeResponse(response=result)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/claude/stream")
+async def claude_stream_endpoint(request: ClaudeRequest):
+    text = request.get_text()
+    if not text:
+        raise HTTPException(status_code=400, detail="Either 'prompt' or 'message' is required")
+    return await _sse_response(lambda usage: stream_claude(text, usage=usage), "anthropic", flight=flight_key("claude-stream", text))
     
 
 
 # openai function (uses PromptRequest from models)
 @app.post("/openai/")
 async def generate_endpoint(request: PromptRequest):
-    response = generate_text(request.prompt)
+    response = await agenerate_text(request.prompt)
     
     if response.startswith("Error:"):
         raise HTTPException(status_code=500, detail=response)
@@ -126,7 +262,7 @@ class ChatRequest(BaseModel):
 async def _handle_chat(request: ChatRequest):
     if not request.message or not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
-    response = await asyncio.to_thread(generate_text, request.message)
+    response = await agenerate_text(request.message)
     if response.startswith("Error:"):
         raise HTTPException(status_code=500, detail=response)
     return {"reply": response}
@@ -145,19 +281,7 @@ async def api_chat_endpoint(request: ChatRequest):
 async def chat_stream_endpoint(request: ChatRequest):
     if not request.message or not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
-
-    async def generate():
-        try:
-            async for chunk in stream_chat(request.message):
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
-        except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
-    )
+    return await _sse_response(lambda usage: stream_chat(request.message, usage=usage), "openai", final_event=False, flight=flight_key("chat-stream", request.message))
 
 
 # Node.js API compatibility - generate-image (OpenAI DALL-E)
@@ -166,12 +290,38 @@ class ImageRequest(BaseModel):
 
 @app.post("/generate-image")
 async def generate_image_endpoint(request: ImageRequest):
-    result = await asyncio.to_thread(generate_image, request.prompt)
+    result = await generate_image(request.prompt)
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
     return {**result, "revised_prompt": request.prompt}
 
 
+class ImageJobRequest(ImageRequest):
+    priority: int = PRIORITY_NORMAL
+
+
+async def _image_job(job, queue):
+    result = await generate_image(job.params["prompt"])
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    if "b64_data_url" in result:
+        data = base64.b64decode(result["b64_data_url"].split(",", 1)[1])
+    else:
+        # DALL-E URLs expire after an hour; keep our own copy
+        response = await provider_clients.http.get(result["url"])
+        response.raise_for_status()
+        data = response.content
+    name = queue.save_file(job, "image.png", data)
+    return {"url": _job_file_url(job.id, name), "revised_prompt": job.params["prompt"]}
+
+job_queue.register("image", _image_job)
+
+
+@app.post("/jobs/image", status_code=202)
+async def image_job_endpoint(request: ImageJobRequest):
+    return _submit_job("image", {"prompt": request.prompt}, request.priority)
+
+
 # Node.js API compatibility - gemini
 class MessageRequest(BaseModel):
     message: str
@@ -180,58 +330,102 @@ class MessageRequest(BaseModel):
 async def gemini_endpoint(request: MessageRequest):
     if not request.message or not request.message.strip():
         raise HTTPException(status_code=400, detail="Message cannot be empty")
-    api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
-    if not api_key:
+    if not get_gemini_api_key():
+        raise HTTPException(status_code=501, detail="Add GOOGLE_API_KEY or GEMINI_API_KEY to fastapi_app/.env (get key from https://aistudio.google.com/apikey)")
+    try:
+        return {"reply": await ask_gemini(request.message)}
+    except GeminiError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
+@app.post("/gemini/stream")
+async def gemini_stream_endpoint(request: MessageRequest):
+    if not request.message or not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    if not get_gemini_api_key():
         raise HTTPException(status_code=501, detail="Add GOOGLE_API_KEY or GEMINI_API_KEY to fastapi_app/.env (get key from https://aistudio.google.com/apikey)")
-    # Use REST API directly (no SDK dependency, more reliable)
-    import json
-    import urllib.request
-    import urllib.error
-    payload = {
-        "contents": [{"parts": [{"text": request.message}]}],
-        "generationConfig": {"temperature": 0.7, "maxOutputTokens": 1024}
+    return await _sse_response(lambda usage: stream_gemini(request.message, usage=usage), "gemini", flight=flight_key("gemini-stream", request.message))
+
+
+@app.get("/router/stats")
+async def router_stats():
+    return provider_router.stats()
+
+
+@app.get("/coalescing/stats")
+async def coalescing_stats():
+    return single_flight.stats()
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    return admission.stats()
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "responses": response_cache.stats(),
+        "documents": document_cache.stats(),
+        "http": fetcher.stats(),
+        "extractions": extraction_cache.stats(),
+        "rag": retrieval_cache.stats(),
+    }
+
+
+def _component_metrics() -> dict:
+    """Cache, coalescing and job counters the components already keep, read at scrape time."""
+    caches = {
+        "responses": response_cache.stats(),
+        "documents": document_cache.stats(),
+        "extractions": extraction_cache.stats(),
+    }
+    if fetcher.cache:
+        caches["http"] = fetcher.cache.stats()
+    caches["rag_embeddings"] = retrieval_cache.embeddings.stats()
+    caches["rag_retrievals"] = retrieval_cache.retrievals.stats()
+    flights, jobs, gates = single_flight.stats(), job_queue.stats(), admission.stats()
+    return {
+        "cache_hit_ratio": ("Cache hit ratio since startup", {(name,): stats["hit_ratio"] for name, stats in caches.items()}, ("cache",)),
+        "single_flight_coalesced_ratio": ("Share of identical in-flight calls served by another caller", {(): flights["coalesced_ratio"]}, ()),
+        "single_flight_in_flight": ("Upstream calls and streams currently shared", {(): flights["in_flight"]}, ()),
+        "jobs_queued": ("Background jobs waiting for a worker", {(): jobs["queued"]}, ()),
+        "jobs_running": ("Background jobs being processed", {(): jobs["running"]}, ()),
+        "admission_in_flight": ("Upstream calls holding an admission slot", {(name,): g["in_flight"] for name, g in gates.items()}, ("provider",)),
+        "admission_waiting": ("Requests queued for an admission slot", {(name,): g["waiting"] for name, g in gates.items()}, ("provider",)),
+        "admission_rejected": (
+            "Requests shed by admission control since startup",
+            {(name, reason): g[f"rejected_{reason}"] for name, g in gates.items() for reason in ("rate", "queue_full", "timeout")},
+            ("provider", "reason"),
+        ),
     }
-    last_error = None
-    for model_id in ["gemini-2.0-flash", "gemini-2.5-flash", "gemini-pro"]:
-        try:
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{model_id}:generateContent?key={api_key}"
-            req = urllib.request.Request(url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json"}, method="POST")
-            with urllib.request.urlopen(req, timeout=60) as resp:
-                data = json.loads(resp.read().decode())
-            text = data.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-            if text:
-                return {"reply": text}
-        except urllib.error.HTTPError as e:
-            last_error = e.read().decode() if e.fp else str(e)
-            if "404" in str(e) or "not found" in last_error.lower():
-                continue
-            if e.code == 429 or "quota" in last_error.lower() or "RESOURCE_EXHAUSTED" in last_error:
-                raise HTTPException(status_code=429, detail="Gemini API quota exceeded. Wait a few minutes or check https://ai.google.dev/gemini-api/docs/rate-limits")
-            raise HTTPException(status_code=e.code, detail=last_error[:500])
-        except Exception as e:
-            last_error = str(e)
-            continue
-    raise HTTPException(status_code=500, detail=last_error or "Gemini API failed")
+
+metrics_registry.register_collector(_component_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
 
 
 # Node.js API compatibility - perplexity
 @app.post("/perplexity")
 async def perplexity_endpoint(request: MessageRequest):
-    api_key = os.getenv("PERPLEXITY_API_KEY")
-    if not api_key:
+    if not get_perplexity_api_key():
         raise HTTPException(status_code=501, detail="Set PERPLEXITY_API_KEY in .env")
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key, base_url="https://api.perplexity.ai")
-        response = client.chat.completions.create(
-            model="llama-3.1-sonar-small-128k-online",
-            messages=[{"role": "user", "content": request.message}],
-        )
-        return {"reply": response.choices[0].message.content}
+        return {"reply": await ask_perplexity(request.message)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/perplexity/stream")
+async def perplexity_stream_endpoint(request: MessageRequest):
+    if not get_perplexity_api_key():
+        raise HTTPException(status_code=501, detail="Set PERPLEXITY_API_KEY in .env")
+    return await _sse_response(lambda usage: stream_perplexity(request.message, usage=usage), "perplexity", flight=flight_key("perplexity-stream", request.message))
+
+
 # numpy
 # class NumbersRequest(BaseModel):
 #     numbers: list[float]
@@ -305,8 +499,31 @@ async def perplexity_endpoint(request: MessageRequest):
     
 
 
-# LlamaIndex service
-llama_service = LlamaService(data_path="data")
+# LlamaIndex service, built by the lifespan warm-up; None until the index is loaded
+llama_service = None
+
+
+def _load_llama_service():
+    global llama_service
+    from llama_service import LlamaService
+
+    llama_service = LlamaService(data_path="data")
+
+
+def _require_llama_service():
+    if llama_service is None:
+        if readiness.status("rag") == "failed":
+            raise HTTPException(status_code=503, detail=f"RAG index failed to load: {readiness.error('rag')}")
+        raise HTTPException(status_code=503, detail="RAG index is still loading", headers={"Retry-After": "5"})
+    return llama_service
+
+
+async def _rag_answer(question: str) -> str:
+    service = _require_llama_service()
+    try:
+        return await service.aquery(question)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="RAG query timed out")
 
 @app.get("/llama_service/")
 def root():
@@ -320,15 +537,42 @@ async def query(request: Request):
     if not user_query:
         return {"error": "No query provided."}
 
-    answer = llama_service.query(user_query)
+    answer = await _rag_answer(user_query)
     return {"response": answer}
 
 
+class RetrieveRequest(BaseModel):
+    query: str
+    top_k: int = Field(5, ge=1, le=50)
+    mode: str | None = None  # hybrid | vector | bm25, defaults to LLAMA_RETRIEVAL_MODE
+
+
+# Ranked chunks with their scores and no LLM synthesis step
+@app.post("/retrieve")
+async def retrieve(request: RetrieveRequest):
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    service = _require_llama_service()
+    start = time.perf_counter()
+    try:
+        results = await service.aretrieve(request.query, top_k=request.top_k, mode=request.mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Retrieval timed out")
+    return {
+        "query": request.query,
+        "mode": request.mode or service.retrieval_mode,
+        "results": results,
+        "took_ms": round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
 # fitness
 @app.post("/fitness", response_model=FitnessResponse)
 async def get_fitness_plan(request: FitnessRequest):
     try:
-        result = generate_fitness_plan(request.dict())
+        result = await generate_fitness_plan(request.dict())
         return FitnessResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -338,19 +582,46 @@ async def get_fitness_plan(request: FitnessRequest):
 # tech stack: Backend: FastAPI, Frontend: Angular, AI Models: OpenAI GPT-4, 
 #             Knowledge Graph: LangGraph, Orchestration/Logging: LangFuse / LangSmith
 #             Visualization: Agno or D3.js in Angular
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+async def _spool_upload(file: UploadFile) -> tuple[str, str]:
+    """
+    Copy an upload to a uniquely named temp file in chunks, enforcing UPLOAD_MAX_BYTES.
+    Returns (temp_path, sha256_of_contents).
+    """
+    suffix = os.path.splitext(file.filename or "")[1] or ".pdf"
+    tmp = tempfile.NamedTemporaryFile(prefix="upload_", suffix=suffix, delete=False)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with tmp:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File exceeds {UPLOAD_MAX_BYTES} bytes")
+                digest.update(chunk)
+                tmp.write(chunk)
+    except BaseException:
+        os.remove(tmp.name)
+        raise
+    return tmp.name, digest.hexdigest()
+
+
 @app.post("/upload")
 async def upload_file(file: UploadFile):
-    temp_file_path = f"temp_{file.filename}"
+    temp_file_path, sha256 = await _spool_upload(file)
     try:
-        with open(temp_file_path, "wb") as f:
-            shutil.copyfileobj(file.file, f)
-
-        # Process document to get summary and graph
-        summary, graph = process_document(temp_file_path)
+        # Process document to get summary and graph (repeat uploads are served from cache)
+        summary, graph, cache_hit = await process_document_cached(temp_file_path, sha256)
+        # Merge into the cross-document concept graph (no-op if this file was merged before)
+        await asyncio.to_thread(concept_graph_store.add_graph, sha256, graph)
 
         return {
             "summary": summary,
-            "graph": graph
+            "graph": graph,
+            "meta": {"sha256": sha256, "cache": "hit" if cache_hit else "miss"}
         }
     finally:
         # Clean up temp file
@@ -358,6 +629,64 @@ async def upload_file(file: UploadFile):
             os.remove(temp_file_path)
 
 
+async def _upload_job(job, queue):
+    path, sha256 = job.params["path"], job.params["sha256"]
+    try:
+        summary, graph, cache_hit = await process_document_cached(path, sha256)
+        await asyncio.to_thread(concept_graph_store.add_graph, sha256, graph)
+        return {"summary": summary, "graph": graph, "meta": {"sha256": sha256, "cache": "hit" if cache_hit else "miss"}}
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+def _discard_upload(job):
+    if os.path.exists(job.params["path"]):
+        os.remove(job.params["path"])
+
+job_queue.register("upload", _upload_job, discard=_discard_upload)
+
+
+@app.post("/jobs/upload", status_code=202)
+async def upload_job_endpoint(file: UploadFile, priority: int = PRIORITY_NORMAL):
+    """/upload as a background job; the summary and graph become the job's result."""
+    temp_file_path, sha256 = await _spool_upload(file)
+    try:
+        return _submit_job("upload", {"path": temp_file_path, "sha256": sha256}, priority)
+    except BaseException:
+        os.remove(temp_file_path)
+        raise
+
+
+# Concept graph queries - served from the merged graph index, no model calls
+@app.get("/graph/stats")
+async def graph_stats():
+    return concept_graph_store.stats()
+
+
+@app.get("/graph/neighbors")
+async def graph_neighbors(concept: str):
+    neighbors = concept_graph_store.neighbors(concept)
+    if neighbors is None:
+        raise HTTPException(status_code=404, detail=f"Unknown concept: {concept}")
+    return {"concept": concept, "neighbors": neighbors}
+
+
+@app.get("/graph/subgraph")
+async def graph_subgraph(concept: str, k: int = 1, max_nodes: int = 200):
+    subgraph = concept_graph_store.subgraph(concept, k=max(0, min(k, 5)), max_nodes=max_nodes)
+    if subgraph is None:
+        raise HTTPException(status_code=404, detail=f"Unknown concept: {concept}")
+    return subgraph
+
+
+@app.get("/graph/path")
+async def graph_path(source: str, target: str):
+    path = concept_graph_store.shortest_path(source, target)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"No path between {source!r} and {target!r}")
+    return {"source": source, "target": target, "hops": len(path) - 1, "path": path}
+
+
 # Web scrape
 class UrlListRequest(BaseModel):
     urls: list[str]
@@ -367,53 +696,167 @@ async def scrape_multiple(data: UrlListRequest):
     return await scrape_multiple_urls(data.urls)
 
 
+# Streaming variant - one record per URL in completion order, then a final summary record
+class UrlStreamRequest(UrlListRequest):
+    deadline: float = 30.0       # seconds allowed per URL
+    max_in_flight: int = 10      # URLs scraped concurrently
+    format: str = "ndjson"       # "ndjson" or "sse"
+
+@app.post("/scrape-multiple/stream")
+async def scrape_multiple_stream(data: UrlStreamRequest):
+    if data.format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    max_in_flight = max(1, min(data.max_in_flight, 50))
+
+    def encode(record: dict) -> str:
+        if data.format == "sse":
+            return f"data: {json.dumps(record)}\n\n"
+        return json.dumps(record) + "\n"
+
+    async def generate():
+        start = asyncio.get_running_loop().time()
+        count = 0
+        async for result in scrape_urls_stream(data.urls, deadline=data.deadline, max_in_flight=max_in_flight):
+            count += 1
+            yield encode(result)
+        elapsed_ms = round((asyncio.get_running_loop().time() - start) * 1000, 1)
+        yield encode({"done": True, "count": count, "elapsed_ms": elapsed_ms})
+
+    media_type = "text/event-stream" if data.format == "sse" else "application/x-ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # Node.js API compatibility - voice-chatbot (OpenAI Whisper + GPT + TTS)
 @app.post("/voice-chatbot")
 async def voice_chatbot(audio: UploadFile = File(...)):
     try:
-        import io
-        from openai import OpenAI
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        # Read file into BytesIO (fixes SpooledTemporaryFile pointer issue with Whisper)
-        audio_bytes = await audio.read()
-        if not audio_bytes or len(audio_bytes) < 100:
-            raise HTTPException(status_code=400, detail="Audio too short or empty. Record for at least 1 second.")
-        audio_file = io.BytesIO(audio_bytes)
-        audio_file.name = audio.filename or "audio.webm"
         # Speech to text
-        transcript = client.audio.transcriptions.create(model="whisper-1", file=audio_file)
-        user_text = transcript.text
+        user_text = await _transcribe_upload(audio)
         # Generate response
-        reply_text = generate_text(user_text)
+        reply_text = await agenerate_text(user_text)
         if reply_text.startswith("Error:"):
             raise HTTPException(status_code=500, detail=reply_text)
         # Text to speech
-        tts = client.audio.speech.create(model="tts-1", voice="alloy", input=reply_text)
-        import base64
-        audio_base64 = base64.b64encode(tts.content).decode()
+        audio_base64 = base64.b64encode(await synthesize(reply_text)).decode()
         return {"userText": user_text, "botReply": reply_text, "audioBase64": audio_base64}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# Node.js API compatibility - video generation (stub)
+async def _transcribe_upload(audio: UploadFile) -> str:
+    # Read file into BytesIO (fixes SpooledTemporaryFile pointer issue with Whisper)
+    audio_bytes = await audio.read()
+    if not audio_bytes or len(audio_bytes) < 100:
+        raise HTTPException(status_code=400, detail="Audio too short or empty. Record for at least 1 second.")
+    return await transcribe(audio_bytes, audio.filename or "audio.webm")
+
+
+@app.post("/voice-chatbot/stream")
+async def voice_chatbot_stream(audio: UploadFile = File(...)):
+    """
+    Streaming variant of /voice-chatbot: the reply is spoken sentence by sentence
+    while the chat model is still generating. The body is chunked audio/mpeg;
+    the transcript is returned URL-encoded in the X-User-Text header.
+    """
+    try:
+        user_text = await _transcribe_upload(audio)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    # The chat stream holds an OpenAI slot until its last token; each TTS call
+    # takes its own, so the chat slot must not wait for the speech to finish
+    release = await admission.acquire("openai")
+
+    async def chat_tokens(usage):
+        try:
+            async for token in stream_chat(user_text, usage=usage):
+                yield token
+        finally:
+            await release()
+
+    async def audio_chunks():
+        # Starlette skips the background task when the body raises, so the
+        # slot is released here too; the idempotent background release only
+        # covers a body that never started (client gone before the first chunk)
+        usage = {}
+        try:
+            async for chunk in speak(chat_tokens(usage)):
+                yield chunk
+        finally:
+            await release()
+            record_usage("openai", usage.get("model"), usage.get("input_tokens"), usage.get("output_tokens"))
+
+    return StreamingResponse(
+        audio_chunks(),
+        media_type="audio/mpeg",
+        headers={"X-User-Text": quote(user_text), "Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release),
+    )
+
+
+# Node.js API compatibility - video generation (background job, poll /video-status/{id})
 class VideoRequest(BaseModel):
     prompt: str
+    priority: int = PRIORITY_NORMAL
+
+
+async def _video_job(job, queue):
+    name = queue.save_file(job, "video.mp4", await generate_video(job.params["prompt"]))
+    return {"url": _job_file_url(job.id, name)}
+
+job_queue.register("video", _video_job)
+
 
-@app.post("/generate-video")
+@app.post("/generate-video", status_code=202)
 async def generate_video_endpoint(request: VideoRequest):
-    raise HTTPException(
-        status_code=501,
-        detail="Video generation requires OpenAI Sora or similar API. Not yet implemented in FastAPI."
-    )
+    accepted = _submit_job("video", {"prompt": request.prompt}, request.priority)
+    return {**accepted, "statusUrl": f"/video-status/{accepted['id']}"}
 
 
 @app.get("/video-status/{id}")
 async def video_status(id: str):
-    raise HTTPException(
-        status_code=501,
-        detail="Video status endpoint not yet implemented in FastAPI."
-    )
+    return await job_status(id)
+
+
+# Background jobs: submit returns 202 + an id; poll /jobs/{id}, fetch files by URL
+def _job_file_url(job_id: str, name: str) -> str:
+    return app.url_path_for("job_file", id=job_id, name=name)
+
+
+def _submit_job(kind: str, params: dict, priority: int) -> dict:
+    try:
+        job = job_queue.submit(kind, params, priority=priority)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Job queue is full: {e}", headers={"Retry-After": "30"})
+    return {"id": job.id, "status": job.status, "statusUrl": app.url_path_for("job_status", id=job.id)}
+
+
+@app.get("/jobs/stats")
+async def job_stats():
+    return job_queue.stats()
+
+
+@app.get("/jobs/{id}", name="job_status")
+async def job_status(id: str):
+    job = job_queue.get(id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.public()
+
+
+@app.get("/jobs/{id}/files/{name}", name="job_file")
+async def job_file(id: str, name: str):
+    path = job_queue.file_path(id, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found or expired")
+    return FileResponse(path)
 
 
 # RAG compatibility - accept both query and question
@@ -423,5 +866,5 @@ async def rag_query(request: Request):
     user_query = data.get("query") or data.get("question")
     if not user_query:
         return {"error": "No query or question provided.", "reply": ""}
-    answer = llama_service.query(user_query)
+    answer = await _rag_answer(user_query)
     return {"response": answer, "reply": answer}
\ No newline at end of file
@@ -15,89 +15,150 @@
 
 import os
 from dotenv import load_dotenv
-from openai import OpenAI, AsyncOpenAI
+from functools import partial
+
+from services.admission import AdmissionRejected, admission
+from services.metrics import record_usage, track_upstream
+from services.provider_clients import provider_clients
+from services.provider_router import AllCandidatesFailed, Candidate, provider_router
+from services.response_cache import response_cache
+from services.single_flight import flight_key, single_flight
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI clients
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 
-async def stream_chat(prompt: str):
-    """Stream chat completion tokens as they arrive."""
-    stream = await async_client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        stream=True
+TEXT_MODEL = "gpt-4o-mini"  # You can also use gpt-4o, gpt-4-turbo, etc.
+
+
+def _text_messages(prompt: str) -> list[dict]:
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+async def stream_chat(prompt: str, usage: dict | None = None):
+    """Stream chat completion tokens as they arrive. Token usage is written into `usage` when the stream ends."""
+    stream = await provider_clients.openai.chat.completions.create(
+        model=TEXT_MODEL,
+        messages=_text_messages(prompt),
+        stream=True,
+        stream_options={"include_usage": True},  # final chunk (no choices) carries the token counts
     )
     async for chunk in stream:
         if chunk.choices and chunk.choices[0].delta.content:
             yield chunk.choices[0].delta.content
+        if getattr(chunk, "usage", None) and usage is not None:
+            usage.update(model=TEXT_MODEL, input_tokens=chunk.usage.prompt_tokens, output_tokens=chunk.usage.completion_tokens)
+
+
+async def _complete_text(messages: list[dict]) -> str:
+    with track_upstream("openai", TEXT_MODEL):
+        response = await provider_clients.openai.chat.completions.create(model=TEXT_MODEL, messages=messages)
+    if response.usage:
+        record_usage("openai", TEXT_MODEL, response.usage.prompt_tokens, response.usage.completion_tokens)
+    text = response.choices[0].message.content
+    await response_cache.aset("openai", TEXT_MODEL, messages, text)
+    return text
 
 
-def generate_text(prompt: str) -> str:
+async def agenerate_text(prompt: str) -> str:
     """
-    Generate a response from OpenAI based on the provided prompt.
+    Generate a response from OpenAI based on the provided prompt. Cache hits
+    and callers joining an identical in-flight prompt return without an
+    admission slot; only the call that actually goes upstream holds one.
     """
+    messages = _text_messages(prompt)
+    cached = await response_cache.aget("openai", TEXT_MODEL, messages)
+    if cached is not None:
+        return cached
+
+    async def _run():
+        async with admission.slot("openai"):
+            return await _complete_text(messages)
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",  # You can also use gpt-4o, gpt-4-turbo, etc.
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        return response.choices[0].message.content
+        return await single_flight.do(flight_key("openai", TEXT_MODEL, messages), _run)
+    except AdmissionRejected:
+        raise
     except Exception as e:
         return f"Error: {str(e)}"
 
 
-def generate_image(prompt: str) -> dict:
+async def _generate_gpt_image(prompt: str) -> dict:
+    # gpt-image-1-mini: ~2-10s, superior prompt following
+    response = await provider_clients.openai.images.generate(
+        model="gpt-image-1-mini",
+        prompt=prompt.strip(),
+        size="1024x1024",
+        quality="low",  # fastest; use "medium" or "high" for better quality
+    )
+    data = response.data[0]
+    b64 = getattr(data, "b64_json", None) or (data.model_dump() if hasattr(data, "model_dump") else {}).get("b64_json")
+    if b64:
+        return {"b64_data_url": f"data:image/png;base64,{b64}"}
+    url = getattr(data, "url", None)
+    if url:
+        return {"url": url}
+    raise RuntimeError("gpt-image-1-mini returned no image data")
+
+
+async def _generate_dalle3_image(prompt: str) -> dict:
+    # DALL-E 3 with quality=standard (faster) and style=natural (closer to prompt)
+    response = await provider_clients.openai.images.generate(
+        model="dall-e-3",
+        prompt=prompt.strip(),
+        n=1,
+        size="1024x1024",
+        quality="standard",  # faster than "hd"
+        style="natural",    # more literal prompt following, less creative rewriting
+        response_format="url",
+    )
+    return {"url": response.data[0].url}
+
+
+async def generate_image(prompt: str) -> dict:
     """
     Generate an image from the prompt. Tries gpt-image-1-mini first (faster, better
-    prompt following), falls back to DALL-E 3 if unavailable.
-    Returns {"url": str} or {"b64_data_url": str} for display.
+    prompt following), falls back to DALL-E 3 when it is unavailable, failing or
+    slower than usual (via the shared provider router).
+    Returns {"url": str} or {"b64_data_url": str} for display, or {"error": str}.
     """
-    # Try gpt-image-1-mini first: ~2-10s, superior prompt following
-    try:
-        response = client.images.generate(
-            model="gpt-image-1-mini",
-            prompt=prompt.strip(),
-            size="1024x1024",
-            quality="low",  # fastest; use "medium" or "high" for better quality
-        )
-        data = response.data[0]
-        b64 = getattr(data, "b64_json", None) or (data.model_dump() if hasattr(data, "model_dump") else {}).get("b64_json")
-        if b64:
-            return {"b64_data_url": f"data:image/png;base64,{b64}"}
-        url = getattr(data, "url", None)
-        if url:
-            return {"url": url}
-    except Exception as e:
-        err_msg = str(e).lower()
-        # Fall back to DALL-E 3 if gpt-image not available (e.g. org not verified)
-        if "403" in err_msg or "not found" in err_msg or "organization" in err_msg:
-            pass
-        else:
-            return {"error": f"Error: {str(e)}"}
-
-    # Fallback: DALL-E 3 with quality=standard (faster) and style=natural (closer to prompt)
+    from openai import BadRequestError
+
+    candidates = [
+        Candidate("openai:gpt-image-1-mini", partial(_generate_gpt_image, prompt)),
+        Candidate("openai:dall-e-3", partial(_generate_dalle3_image, prompt)),
+    ]
     try:
-        response = client.images.generate(
-            model="dall-e-3",
-            prompt=prompt.strip(),
-            n=1,
-            size="1024x1024",
-            quality="standard",  # faster than "hd"
-            style="natural",    # more literal prompt following, less creative rewriting
-            response_format="url",
-        )
-        return {"url": response.data[0].url}
-    except Exception as e:
+        # A rejected prompt (400, e.g. content policy) would be rejected by both models
+        async def call():
+            async with admission.slot("openai"):
+                return await provider_router.call(candidates, is_fatal=lambda e: isinstance(e, BadRequestError))
+
+        return await single_flight.do(flight_key("openai-image", prompt), call)
+    except AllCandidatesFailed as e:
+        return {"error": f"Error: {str(e.last_error or e)}"}
+    except BadRequestError as e:
         return {"error": f"Error: {str(e)}"}
 
+
+VIDEO_MODEL = os.getenv("OPENAI_VIDEO_MODEL", "sora-2")
+
+
+async def generate_video(prompt: str) -> bytes:
+    """
+    Generate a video with the OpenAI videos API (Sora) and return the MP4 bytes.
+    Polls until the render finishes, so run it as a background job.
+    """
+    videos = getattr(provider_clients.openai, "videos", None)
+    if videos is None:
+        raise RuntimeError("Video generation needs an openai SDK with the videos API (openai>=2.3)")
+    video = await videos.create_and_poll(model=VIDEO_MODEL, prompt=prompt.strip())
+    if video.status != "completed":
+        error = getattr(video, "error", None)
+        raise RuntimeError(f"Video generation {video.status}: {getattr(error, 'message', None) or 'no details'}")
+    content = await videos.download_content(video.id)
+    return content.content
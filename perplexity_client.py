@@ -0,0 +1,49 @@
+# Perplexity client (OpenAI-compatible API)
+# Uses the shared pooled AsyncOpenAI client from services.provider_clients.
+
+import os
+from dotenv import load_dotenv
+
+from services.admission import admission
+from services.metrics import record_usage, track_upstream
+from services.provider_clients import provider_clients
+
+load_dotenv()
+
+PERPLEXITY_MODEL = "llama-3.1-sonar-small-128k-online"
+
+
+def get_perplexity_api_key() -> str | None:
+    return os.getenv("PERPLEXITY_API_KEY")
+
+
+async def ask_perplexity(message: str) -> str:
+    """Send a message to Perplexity and return the reply text."""
+    async with admission.slot("perplexity"):
+        with track_upstream("perplexity", PERPLEXITY_MODEL):
+            response = await provider_clients.perplexity.chat.completions.create(
+                model=PERPLEXITY_MODEL,
+                messages=[{"role": "user", "content": message}],
+            )
+    if response.usage:
+        record_usage("perplexity", PERPLEXITY_MODEL, response.usage.prompt_tokens, response.usage.completion_tokens)
+    return response.choices[0].message.content
+
+
+async def stream_perplexity(message: str, usage: dict | None = None):
+    """Stream Perplexity's reply as text deltas. Token usage is written into `usage` when reported."""
+    stream = await provider_clients.perplexity.chat.completions.create(
+        model=PERPLEXITY_MODEL,
+        messages=[{"role": "user", "content": message}],
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+        # Perplexity reports cumulative usage on streamed chunks; keep the latest
+        if usage is not None and getattr(chunk, "usage", None):
+            usage.update(
+                model=PERPLEXITY_MODEL,
+                input_tokens=chunk.usage.prompt_tokens,
+                output_tokens=chunk.usage.completion_tokens,
+            )
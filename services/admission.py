@@ -0,0 +1,175 @@
+# services/admission.py
+# Admission control per upstream provider: a concurrency limit, a token-bucket
+# request rate and a bounded wait queue with a deadline. Requests that cannot
+# start in time are shed immediately with 429 (rate) or 503 (capacity) and a
+# Retry-After hint, instead of piling up threads and sockets until the client
+# or the provider gives up.
+import asyncio
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+PROVIDERS = ("openai", "anthropic", "gemini", "perplexity")
+
+
+class AdmissionRejected(HTTPException):
+    """
+    An HTTPException so every endpoint's existing `except HTTPException: raise`
+    passes it through unchanged and FastAPI sends the status and Retry-After header.
+    """
+
+    def __init__(self, provider: str, status_code: int, reason: str, retry_after: float):
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=status_code,
+            detail=f"{provider} is overloaded ({reason}), retry in {self.retry_after}s",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate  # tokens per second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it (0 = now)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def unreserve(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class ProviderGate:
+    def __init__(self, name: str, max_concurrency: int, rate: float = 0.0, burst: int = 0, max_queue: int = 100, max_wait: float = 10.0):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.bucket = TokenBucket(rate, burst or max(1, math.ceil(rate))) if rate > 0 else None
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self._avg_hold = 1.0  # EWMA of seconds a slot is held, for Retry-After estimates
+        self._stats = {"admitted": 0, "rejected_rate": 0, "rejected_queue_full": 0, "rejected_timeout": 0}
+
+    def _retry_after(self) -> float:
+        return self._avg_hold * (self.waiting + 1) / self.max_concurrency
+
+    def _reject(self, kind: str, status_code: int, reason: str, retry_after: float):
+        self._stats[kind] += 1
+        raise AdmissionRejected(self.name, status_code, reason, retry_after)
+
+    @asynccontextmanager
+    async def slot(self, max_wait: float | None = None):
+        """Hold one upstream call slot; raises AdmissionRejected if it cannot start within max_wait."""
+        deadline = time.monotonic() + (self.max_wait if max_wait is None else max_wait)
+        delay = self.bucket.reserve() if self.bucket is not None else 0.0
+        if delay == 0 and not self._slots.locked():
+            await self._slots.acquire()  # fast path: free slot, never suspends
+        else:
+            if self.waiting >= self.max_queue:
+                if self.bucket is not None:
+                    self.bucket.unreserve()
+                self._reject("rejected_queue_full", 503, "queue full", self._retry_after())
+            if time.monotonic() + delay > deadline:
+                if self.bucket is not None:
+                    self.bucket.unreserve()
+                if delay:
+                    self._reject("rejected_rate", 429, "rate limit", delay)
+                self._reject("rejected_timeout", 503, "no free slot", self._retry_after())
+            self.waiting += 1
+            try:
+                if delay:
+                    await asyncio.sleep(delay)
+                try:
+                    await asyncio.wait_for(self._slots.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    self._reject("rejected_timeout", 503, "no free slot", self._retry_after())
+            finally:
+                self.waiting -= 1
+
+        self.in_flight += 1
+        self._stats["admitted"] += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._avg_hold += 0.1 * ((time.monotonic() - start) - self._avg_hold)
+            self._slots.release()
+
+    async def acquire(self, max_wait: float | None = None):
+        """slot() for holders that outlive the calling function (streams); call the returned release()."""
+        context = self.slot(max_wait)
+        await context.__aenter__()
+        released = False
+
+        async def release():
+            nonlocal released
+            if not released:
+                released = True
+                await context.__aexit__(None, None, None)
+
+        return release
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "rate": self.bucket.rate if self.bucket else None,
+        }
+
+
+class AdmissionController:
+    def __init__(self, gates: dict[str, ProviderGate]):
+        self.gates = gates
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        """
+        ADMISSION_<PROVIDER>_CONCURRENCY / _RATE (requests per second, 0 = unlimited) /
+        _BURST / _QUEUE / _MAX_WAIT, falling back to the ADMISSION_DEFAULT_* values.
+        """
+        def setting(provider: str, key: str, default: str) -> str:
+            return os.getenv(f"ADMISSION_{provider.upper()}_{key}", os.getenv(f"ADMISSION_DEFAULT_{key}", default))
+
+        return cls({
+            provider: ProviderGate(
+                provider,
+                max_concurrency=int(setting(provider, "CONCURRENCY", "16")),
+                rate=float(setting(provider, "RATE", "0")),
+                burst=int(setting(provider, "BURST", "0")),
+                max_queue=int(setting(provider, "QUEUE", "100")),
+                max_wait=float(setting(provider, "MAX_WAIT", "10")),
+            )
+            for provider in PROVIDERS
+        })
+
+    def slot(self, provider: str, max_wait: float | None = None):
+        return self.gates[provider].slot(max_wait)
+
+    async def acquire(self, provider: str, max_wait: float | None = None):
+        return await self.gates[provider].acquire(max_wait)
+
+    def stats(self) -> dict:
+        return {name: gate.stats() for name, gate in self.gates.items()}
+
+
+# Shared admission gates, taken around every direct provider call. LlamaService
+# queries (LLAMA_QUERY_CONCURRENCY) and video renders (job queue workers) are
+# bounded by their own limits instead of holding a slot for their whole run
+admission = AdmissionController.from_env()
@@ -0,0 +1,109 @@
+# services/browser_pool.py
+# Long-lived Playwright Chromium shared by every JS-rendered scrape.
+# Each page gets its own isolated browser context; browsers are recycled after
+# a fixed number of pages to cap memory creep, and heavy resources are blocked.
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+DEFAULT_BLOCKED_RESOURCES = ("image", "font", "media")
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        max_pages: int = 4,
+        pages_per_browser: int = 50,
+        blocked_resources=DEFAULT_BLOCKED_RESOURCES,
+    ):
+        self.pages_per_browser = pages_per_browser
+        self.blocked_resources = set(blocked_resources)
+        self._slots = asyncio.Semaphore(max_pages)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._browser = None
+        self._served = 0  # pages handed out by the current browser
+        self._active = {}  # browser -> open pages (includes retired browsers still draining)
+
+    @classmethod
+    def from_env(cls) -> "BrowserPool":
+        blocked = os.getenv("BROWSER_BLOCKED_RESOURCES")
+        return cls(
+            max_pages=int(os.getenv("BROWSER_MAX_PAGES", "4")),
+            pages_per_browser=int(os.getenv("BROWSER_PAGES_PER_BROWSER", "50")),
+            blocked_resources=blocked.split(",") if blocked is not None else DEFAULT_BLOCKED_RESOURCES,
+        )
+
+    async def _acquire_browser(self):
+        async with self._lock:
+            if self._playwright is None:
+                from playwright.async_api import async_playwright
+
+                self._playwright = await async_playwright().start()
+            needs_new = (
+                self._browser is None
+                or not self._browser.is_connected()
+                or self._served >= self.pages_per_browser
+            )
+            if needs_new:
+                old = self._browser
+                self._browser = await self._playwright.chromium.launch(headless=True)
+                self._served = 0
+                self._active[self._browser] = 0
+                if old is not None and self._active.get(old, 0) == 0:
+                    self._active.pop(old, None)
+                    await self._close_browser(old)
+            self._served += 1
+            self._active[self._browser] += 1
+            return self._browser
+
+    async def _release_browser(self, browser):
+        async with self._lock:
+            self._active[browser] -= 1
+            # A retired browser is closed once its last page is done
+            if browser is not self._browser and self._active[browser] == 0:
+                self._active.pop(browser, None)
+                await self._close_browser(browser)
+
+    @staticmethod
+    async def _close_browser(browser):
+        try:
+            await browser.close()
+        except Exception as e:
+            print(f"⚠️ Error closing browser: {e}")
+
+    async def _route(self, route):
+        if route.request.resource_type in self.blocked_resources:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    @asynccontextmanager
+    async def page(self):
+        """Yield a fresh page in an isolated context; waits while BROWSER_MAX_PAGES are open."""
+        async with self._slots:
+            browser = await self._acquire_browser()
+            try:
+                context = await browser.new_context()
+                try:
+                    if self.blocked_resources:
+                        await context.route("**/*", self._route)
+                    yield await context.new_page()
+                finally:
+                    await context.close()
+            finally:
+                await self._release_browser(browser)
+
+    async def close(self):
+        async with self._lock:
+            for browser in list(self._active):
+                await self._close_browser(browser)
+            self._active.clear()
+            self._browser = None
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+# Shared pool; started lazily on the first JS scrape, closed by the app lifespan
+browser_pool = BrowserPool.from_env()
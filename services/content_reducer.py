@@ -0,0 +1,171 @@
+# services/content_reducer.py
+# Shrink a fetched page before it is pasted into the extraction prompt:
+# drop navigation/footer/script noise, keep headings, paragraphs, lists,
+# tables and links in a compact markdown-like form, then trim to a token
+# budget without losing the page outline.
+import os
+import re
+from urllib.parse import urljoin
+
+NOISE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "form", "button", "nav", "header", "footer", "aside"]
+NOISE_ROLES = {"navigation", "banner", "contentinfo", "search", "complementary"}
+BLOCK_TAGS = ["h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "table", "pre", "blockquote", "dt", "dd"]
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+# Block kinds budgeted first by trim_blocks so the outline survives
+OUTLINE_KINDS = ("title", "heading")
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE_RE = re.compile(r"\+?\d[\d\s().-]{7,}\d")
+
+MAX_TABLE_ROWS = 30
+MAX_LINKS = 40
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+
+        try:
+            _encoding = tiktoken.encoding_for_model("gpt-4.1")
+        except KeyError:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def _text(el) -> str:
+    return " ".join(el.get_text(" ", strip=True).split())
+
+
+def _inline(el, base_url: str | None) -> str:
+    """Element text with its links rendered as [text](url)."""
+    for a in el.find_all("a", href=True):
+        href = a["href"].strip()
+        label = _text(a)
+        if label and href and not href.startswith(("#", "javascript:")):
+            a.replace_with(f"[{label}]({urljoin(base_url, href) if base_url else href})")
+    return _text(el)
+
+
+def _table(el) -> str:
+    rows = []
+    for tr in el.find_all("tr")[:MAX_TABLE_ROWS]:
+        cells = [_text(cell) for cell in tr.find_all(["th", "td"])]
+        if any(cells):
+            rows.append("| " + " | ".join(cells) + " |")
+    return "\n".join(rows)
+
+
+def _contact_block(noise_elements) -> str | None:
+    """Footers and headers are dropped, but they are where contact details usually live."""
+    found = []
+    for el in noise_elements:
+        for a in el.find_all("a", href=True):
+            if a["href"].startswith(("mailto:", "tel:")):
+                found.append(a["href"].split(":", 1)[1].split("?")[0])
+        text = el.get_text(" ", strip=True)
+        found += EMAIL_RE.findall(text) + [p.strip() for p in PHONE_RE.findall(text)]
+    unique = list(dict.fromkeys(f for f in found if f))
+    return "Contact: " + ", ".join(unique[:10]) if unique else None
+
+
+def html_to_blocks(html: str, base_url: str | None = None) -> list[tuple[str, str]]:
+    """
+    Return the page as an ordered list of (kind, text) blocks. kind is "heading"
+    or "content" for the page's own text; the lines added about the page are
+    "title" (budgeted like a heading) and "meta" (links, contact; like content).
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml")
+    noise = soup.find_all(NOISE_TAGS) + soup.find_all(attrs={"role": lambda r: r in NOISE_ROLES})
+    contact = _contact_block(noise)
+    for el in noise:
+        el.decompose()
+
+    root = soup.find("main") or soup.find("article") or soup.body or soup
+    blocks = []
+    if soup.title and soup.title.string:
+        blocks.append(("title", f"Title: {' '.join(soup.title.string.split())}"))
+
+    for el in root.find_all(BLOCK_TAGS):
+        # Nested blocks (a <p> inside an <li>, cells inside a table) are emitted by their outermost block
+        if el.find_parent(BLOCK_TAGS):
+            continue
+        if el.name in HEADING_TAGS:
+            text = _text(el)
+            if text:
+                blocks.append(("heading", "#" * int(el.name[1]) + " " + text))
+        elif el.name == "table":
+            text = _table(el)
+            if text:
+                blocks.append(("content", text))
+        else:
+            text = _inline(el, base_url)
+            if text:
+                blocks.append(("content", ("- " if el.name in ("li", "dd") else "") + text))
+
+    # Links outside of any text block (card grids, button rows) are listed once at the end
+    links = []
+    for a in root.find_all("a", href=True):
+        href = a["href"].strip()
+        label = _text(a)
+        if label and not href.startswith(("#", "javascript:")):
+            links.append(f"[{label}]({urljoin(base_url, href) if base_url else href})")
+    if links:
+        blocks.append(("meta", "Links: " + " ".join(list(dict.fromkeys(links))[:MAX_LINKS])))
+    if contact:
+        blocks.append(("meta", contact))
+    return blocks
+
+
+def content_length(blocks: list[tuple[str, str]]) -> int:
+    """Characters of the page's own headings and text, excluding the title/links/contact lines."""
+    return sum(len(text) for kind, text in blocks if kind in ("heading", "content"))
+
+
+def trim_blocks(blocks: list[tuple[str, str]], max_tokens: int) -> str:
+    """
+    Keep blocks in document order within max_tokens. Headings are budgeted first
+    so the outline survives; content that does not fit is dropped (or truncated
+    for the first block that overflows) and marked with "…".
+    """
+    encoding = _get_encoding()
+    sizes = [len(encoding.encode(text)) + 1 for _, text in blocks]
+    if sum(sizes) <= max_tokens:
+        return "\n".join(text for _, text in blocks)
+
+    remaining = max_tokens - sum(size for (kind, _), size in zip(blocks, sizes) if kind in OUTLINE_KINDS)
+    if remaining < 0:
+        # Even the outline is too long: fall back to plain in-order truncation
+        remaining = max_tokens
+        blocks = [("content", text) for _, text in blocks]
+
+    out, truncated = [], False
+    for (kind, text), size in zip(blocks, sizes):
+        if kind in OUTLINE_KINDS:
+            out.append(text)
+        elif size <= remaining:
+            out.append(text)
+            remaining -= size
+        elif remaining > 20 and not truncated:
+            out.append(encoding.decode(encoding.encode(text)[:remaining - 1]) + "…")
+            remaining, truncated = 0, True
+        elif not truncated:
+            out.append("…")
+            truncated = True
+    return "\n".join(out)
+
+
+def reduce_html(html: str, base_url: str | None = None, max_tokens: int | None = None) -> str:
+    return reduce_html_with_length(html, base_url, max_tokens)[0]
+
+
+def reduce_html_with_length(html: str, base_url: str | None = None, max_tokens: int | None = None) -> tuple[str, int]:
+    """reduce_html() plus content_length() of the page, for deciding whether it needs a JS render."""
+    max_tokens = max_tokens or int(os.getenv("SCRAPE_MAX_TOKENS", "6000"))
+    blocks = html_to_blocks(html, base_url)
+    return trim_blocks(blocks, max_tokens), content_length(blocks)
+
@@ -0,0 +1,101 @@
+# services/disk_cache.py
+# Small on-disk JSON cache: one file per key, least-recently-used files are
+# evicted once the directory grows past max_bytes. Safe to share between
+# uvicorn workers (writes are atomic renames; a lost race just means a miss).
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+class DiskCache:
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None  # bytes on disk, computed lazily
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _path(self, key: str) -> str:
+        name = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, name[:2], name + ".json")
+
+    def _files(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".json"):
+                    yield os.path.join(root, name)
+
+    def get(self, key: str):
+        """Return the stored value for key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+            os.utime(path)  # mark as recently used for LRU eviction
+        except (OSError, ValueError):
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+        return value
+
+    def set(self, key: str, value) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._stats["writes"] += 1
+            if self._size is not None:
+                self._size += os.path.getsize(path) - old_size
+        self._evict_if_needed()
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+        with self._lock:
+            self._size = None
+
+    def _evict_if_needed(self) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(os.path.getsize(p) for p in self._files())
+            if self._size <= self.max_bytes:
+                return
+            entries = []
+            for p in self._files():
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, p))
+            entries.sort()
+            size = sum(e[1] for e in entries)
+            for _, file_size, p in entries:
+                if size <= self.max_bytes:
+                    break
+                try:
+                    os.remove(p)
+                except OSError:
+                    continue
+                size -= file_size
+                self._stats["evictions"] += 1
+            self._size = size
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -1,39 +1,238 @@
 # services/document_processing.py
-import PyPDF2
-from openai import OpenAI
+import asyncio
 import os
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 
-from .graph_service import generate_concept_graph
+from .admission import admission
+from .disk_cache import DiskCache
+from .graph_service import GRAPH_MODEL, generate_concept_graph
+from .metrics import record_usage, track_upstream
+from .provider_clients import provider_clients
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 
-def extract_text_from_pdf(file_path):
-    text = ""
+# CPU-bound PDF parsing runs in a process pool so it never blocks the event loop
+_pdf_pool = None
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(max_workers=int(os.getenv("PDF_WORKERS", "2")))
+    return _pdf_pool
+
+
+def shutdown_pdf_pool():
+    global _pdf_pool
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
+
+
+def iter_pdf_pages(file_path):
+    """Yield each page's text lazily, so only one parsed page is held at a time."""
     with open(file_path, "rb") as f:
+        import PyPDF2
+
         reader = PyPDF2.PdfReader(f)
         for page in reader.pages:
-            text += page.extract_text() + "\n"
-    return text
+            yield (page.extract_text() or "") + "\n"
+
+
+def extract_text_from_pdf(file_path):
+    return "".join(iter_pdf_pages(file_path))
+
+
+async def extract_text_from_pdf_async(file_path):
+    """Extract PDF text in the process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pdf_pool(), extract_text_from_pdf, file_path)
 
-def generate_summary(text):
+async def generate_summary(text):
     """
     Use GPT to generate summary
     """
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": f"Summarize this document:\n{text}"}],
-        temperature=0.5
-    )
+    async with admission.slot("openai"):
+        with track_upstream("openai", "gpt-4"):
+            response = await provider_clients.openai.chat.completions.create(
+                model="gpt-4",
+                messages=[{"role": "user", "content": f"Summarize this document:\n{text}"}],
+                temperature=0.5
+            )
+    if response.usage:
+        record_usage("openai", "gpt-4", response.usage.prompt_tokens, response.usage.completion_tokens)
     summary = response.choices[0].message.content
     return summary
 
-def process_document(file_path):
-    text = extract_text_from_pdf(file_path)
-    summary = generate_summary(text)
+# -----------------------------
+# Map-reduce summarization for long documents
+# -----------------------------
+SUMMARY_MODEL = "gpt-4"
+# gpt-4 has an 8k context: leave room for the instruction and the completion
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+SUMMARY_PARTIAL_MAX_TOKENS = 500
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        import tiktoken
+
+        try:
+            _encoding = tiktoken.encoding_for_model(SUMMARY_MODEL)
+        except KeyError:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    return len(_get_encoding().encode(text))
+
+
+def split_into_token_chunks(text: str, max_tokens: int = SUMMARY_CHUNK_TOKENS) -> list[str]:
+    """
+    Split text into chunks of at most max_tokens, breaking on paragraph
+    boundaries where possible and hard-splitting paragraphs that are too long.
+    """
+    encoding = _get_encoding()
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in text.split("\n"):
+        tokens = encoding.encode(paragraph + "\n")
+        if len(tokens) > max_tokens:
+            if current:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            for start in range(0, len(tokens), max_tokens):
+                chunks.append(encoding.decode(tokens[start:start + max_tokens]))
+            continue
+        if current_tokens + len(tokens) > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        current.append(paragraph + "\n")
+        current_tokens += len(tokens)
+    if current:
+        chunks.append("".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+async def _summarize_async(prompt: str, slots: asyncio.Semaphore, max_tokens: int | None = None) -> str:
+    params = {"max_tokens": max_tokens} if max_tokens else {}
+    async with slots, admission.slot("openai"):
+        with track_upstream("openai", SUMMARY_MODEL):
+            response = await provider_clients.openai.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.5,
+                **params
+            )
+    if response.usage:
+        record_usage("openai", SUMMARY_MODEL, response.usage.prompt_tokens, response.usage.completion_tokens)
+    return response.choices[0].message.content or ""
+
+
+def _group_by_budget(parts: list[str], max_tokens: int) -> list[list[str]]:
+    """Pack consecutive parts into groups under the token budget (at least two per group, so every round shrinks)."""
+    groups, current, current_tokens = [], [], 0
+    for part in parts:
+        tokens = count_tokens(part)
+        if len(current) >= 2 and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def generate_summary_map_reduce(text: str) -> str:
+    """
+    Summarize chunks concurrently (bounded by SUMMARY_CONCURRENCY), then merge the
+    partial summaries hierarchically until they fit in a single final prompt.
+    """
+    slots = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+    # Tokenizing a whole document takes long enough to stall every other request; keep it off the loop
+    chunks = await asyncio.to_thread(split_into_token_chunks, text)
+    if len(chunks) <= 1:
+        return await _summarize_async(f"Summarize this document:\n{text}", slots)
+
+    partials = await asyncio.gather(*(
+        _summarize_async(f"Summarize this section of a longer document:\n{chunk}", slots, SUMMARY_PARTIAL_MAX_TOKENS)
+        for chunk in chunks
+    ))
+    while len(partials) > 1 and await asyncio.to_thread(count_tokens, "\n\n".join(partials)) > SUMMARY_CHUNK_TOKENS:
+        groups = await asyncio.to_thread(_group_by_budget, partials, SUMMARY_CHUNK_TOKENS)
+        partials = await asyncio.gather(*(
+            _summarize_async(
+                "Combine these partial summaries of consecutive sections into one summary:\n" + "\n\n".join(group),
+                slots,
+                SUMMARY_PARTIAL_MAX_TOKENS,
+            )
+            for group in groups
+        ))
+    return await _summarize_async(
+        "These are summaries of consecutive sections of one document. "
+        "Write a single coherent summary of the whole document:\n" + "\n\n".join(partials),
+        slots,
+    )
+
+
+async def generate_summary_async(text: str) -> str:
+    """
+    SUMMARY_MODE: "single" sends the whole text in one prompt (original behaviour),
+    "map_reduce" always chunks, "auto" (default) chunks only when the text exceeds one chunk.
+    """
+    mode = os.getenv("SUMMARY_MODE", "auto")
+    if mode == "single" or (mode == "auto" and await asyncio.to_thread(count_tokens, text) <= SUMMARY_CHUNK_TOKENS):
+        return await generate_summary(text)
+    return await generate_summary_map_reduce(text)
+
+
+# -----------------------------
+# Content-addressed result cache
+# -----------------------------
+# Bump whenever extraction, prompts or post-processing change, so stale results are not served
+PIPELINE_VERSION = "1"
+
+document_cache = DiskCache(
+    os.getenv("UPLOAD_CACHE_DIR", os.path.join(".cache", "uploads")),
+    max_bytes=int(os.getenv("UPLOAD_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
+
+
+def document_cache_key(sha256: str) -> str:
+    return f"{sha256}:{PIPELINE_VERSION}:{SUMMARY_MODEL}:{GRAPH_MODEL}:{os.getenv('SUMMARY_MODE', 'auto')}"
+
+
+async def process_document_cached(file_path, sha256: str):
+    """
+    process_document_async behind the content-addressed cache.
+    Returns (summary, graph, cache_hit).
+    """
+    key = document_cache_key(sha256)
+    cached = await asyncio.to_thread(document_cache.get, key)
+    if cached is not None:
+        return cached["summary"], cached["graph"], True
+    summary, graph = await process_document_async(file_path)
+    # An empty summary or graph means generation failed (e.g. unparseable model output);
+    # caching it would serve the failure for this file until PIPELINE_VERSION changes
+    if summary and graph.get("nodes"):
+        await asyncio.to_thread(document_cache.set, key, {"summary": summary, "graph": graph})
+    else:
+        print(f"⚠️ Not caching results for {sha256[:12]}: empty summary or concept graph")
+    return summary, graph, False
+
+
+async def process_document_async(file_path):
+    """Summary and concept graph for a PDF: parsing in the process pool, LLM calls on the shared async client."""
+    text = await extract_text_from_pdf_async(file_path)
+    summary = await generate_summary_async(text)
     # Use GPT-based concept extraction for richer graph
-    graph = generate_concept_graph(summary)
+    graph = await generate_concept_graph(summary)
     return summary, graph
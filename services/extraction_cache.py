@@ -0,0 +1,155 @@
+# services/extraction_cache.py
+# Reuse earlier LLM extractions for scraped pages whose content is unchanged
+# (exact tier: normalized content hash, persisted on disk) or a near-duplicate
+# of a page seen before (SimHash fingerprints with banded lookup, in memory).
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from .disk_cache import DiskCache
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4  # 4 x 16-bit bands: any pair within 3 bits shares at least one band exactly
+
+
+def normalize_content(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_content(text).encode("utf-8")).hexdigest()
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash over word shingles of the normalized text."""
+    words = re.findall(r"\w+", text.lower())
+    shingles = [" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))]
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+def _bands(fingerprint: int):
+    width = SIMHASH_BITS // SIMHASH_BANDS
+    mask = (1 << width) - 1
+    for band in range(SIMHASH_BANDS):
+        yield band, (fingerprint >> (band * width)) & mask
+
+
+class NearDuplicateIndex:
+    """Bounded LRU of SimHash fingerprints with banded buckets for sub-linear lookup."""
+
+    def __init__(self, max_entries: int = 10_000, max_distance: int = 3):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._fingerprints: OrderedDict[str, int] = OrderedDict()  # key -> fingerprint
+        self._buckets: dict[tuple[int, int], set[str]] = {}
+
+    def add(self, key: str, fingerprint: int):
+        if key in self._fingerprints:
+            self._fingerprints.move_to_end(key)
+            return
+        self._fingerprints[key] = fingerprint
+        for band in _bands(fingerprint):
+            self._buckets.setdefault(band, set()).add(key)
+        while len(self._fingerprints) > self.max_entries:
+            self._remove(next(iter(self._fingerprints)))
+
+    def _remove(self, key: str):
+        fingerprint = self._fingerprints.pop(key)
+        for band in _bands(fingerprint):
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def find(self, fingerprint: int) -> str | None:
+        best_key, best_distance = None, self.max_distance + 1
+        for band in _bands(fingerprint):
+            for key in self._buckets.get(band, ()):
+                distance = bin(self._fingerprints[key] ^ fingerprint).count("1")
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+        if best_key is not None:
+            self._fingerprints.move_to_end(best_key)
+        return best_key
+
+
+class ExtractionCache:
+    def __init__(self, namespace: str, cache: DiskCache, near_duplicates: NearDuplicateIndex | None = None, min_words: int = 50):
+        self.namespace = namespace  # model + prompt version: a change invalidates every entry
+        self.cache = cache
+        self.near_duplicates = near_duplicates
+        self.min_words = min_words  # SimHash is unreliable on very short pages
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "near_duplicate_hits": 0, "misses": 0}
+
+    @classmethod
+    def from_env(cls, namespace: str) -> "ExtractionCache":
+        near = None
+        if os.getenv("EXTRACTION_NEAR_DUPLICATES", "true").lower() in ("1", "true", "yes"):
+            near = NearDuplicateIndex(
+                max_entries=int(os.getenv("EXTRACTION_NEAR_DUPLICATE_ENTRIES", "10000")),
+                max_distance=int(os.getenv("EXTRACTION_NEAR_DUPLICATE_DISTANCE", "3")),
+            )
+        return cls(
+            namespace,
+            DiskCache(
+                os.getenv("EXTRACTION_CACHE_DIR", os.path.join(".cache", "extractions")),
+                max_bytes=int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(128 * 1024 * 1024))),
+            ),
+            near,
+        )
+
+    def _key(self, digest: str) -> str:
+        return f"{self.namespace}:{digest}"
+
+    def _fingerprint(self, text: str) -> int | None:
+        if self.near_duplicates is None or len(text.split()) < self.min_words:
+            return None
+        return simhash(text)
+
+    def get(self, text: str) -> tuple[str | None, str | None]:
+        """Return (extracted_data, "exact" | "near_duplicate") or (None, None) on a miss."""
+        key = self._key(content_hash(text))
+        entry = self.cache.get(key)
+        if entry is not None:
+            with self._lock:
+                self._stats["exact_hits"] += 1
+            return entry["data"], "exact"
+
+        fingerprint = self._fingerprint(text)
+        if fingerprint is not None:
+            with self._lock:
+                match = self.near_duplicates.find(fingerprint)
+            entry = self.cache.get(match) if match else None
+            if entry is not None:
+                with self._lock:
+                    self._stats["near_duplicate_hits"] += 1
+                return entry["data"], "near_duplicate"
+        with self._lock:
+            self._stats["misses"] += 1
+        return None, None
+
+    def set(self, text: str, data: str):
+        key = self._key(content_hash(text))
+        self.cache.set(key, {"data": data})
+        fingerprint = self._fingerprint(text)
+        if fingerprint is not None:
+            with self._lock:
+                self.near_duplicates.add(key, fingerprint)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            if self.near_duplicates is not None:
+                stats["fingerprints"] = len(self.near_duplicates._fingerprints)
+        lookups = stats["exact_hits"] + stats["near_duplicate_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["exact_hits"] + stats["near_duplicate_hits"]) / lookups if lookups else 0.0
+        return stats
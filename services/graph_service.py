@@ -1,20 +1,27 @@
 # Simple concept extraction + node creation using GPT
-from openai import OpenAI
-import os
 from dotenv import load_dotenv
 
+from .admission import admission
+from .metrics import record_usage, track_upstream
+from .provider_clients import provider_clients
+
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def generate_concept_graph(summary: str):
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a data scientist."},
-            {"role": "user", "content": f"Extract key concepts and relationships from the following text as JSON nodes and edges:\n{summary}"}
-        ]
-    )
+GRAPH_MODEL = "gpt-4"
+
+async def generate_concept_graph(summary: str):
+    async with admission.slot("openai"):
+        with track_upstream("openai", GRAPH_MODEL):
+            response = await provider_clients.openai.chat.completions.create(
+                model=GRAPH_MODEL,
+                messages=[
+                    {"role": "system", "content": "You are a data scientist."},
+                    {"role": "user", "content": f"Extract key concepts and relationships from the following text as JSON nodes and edges:\n{summary}"}
+                ]
+            )
+    if response.usage:
+        record_usage("openai", GRAPH_MODEL, response.usage.prompt_tokens, response.usage.completion_tokens)
     # Expect JSON output like: {"nodes": [...], "edges": [...]}
     import json
     import re
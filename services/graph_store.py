@@ -0,0 +1,270 @@
+# services/graph_store.py
+# Persistent concept graph merged across every processed document.
+# Concept names are canonicalized so "Machine Learning", "machine-learning" and
+# "machine learning." collapse to one node; neighbour / k-hop / shortest-path
+# queries are answered from in-memory adjacency indexes without calling a model.
+import json
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # no flock on Windows; run a single worker there
+    fcntl = None
+
+_NODE_NAME_KEYS = ("label", "name", "concept", "title", "id")
+_EDGE_SOURCE_KEYS = ("source", "from", "src", "start")
+_EDGE_TARGET_KEYS = ("target", "to", "dst", "end")
+_EDGE_RELATION_KEYS = ("relation", "relationship", "label", "type", "name")
+
+
+def canonicalize(name) -> str:
+    text = unicodedata.normalize("NFKC", str(name)).lower()
+    text = re.sub(r"[_\-/]+", " ", text)
+    text = re.sub(r"[^\w\s]", "", text)
+    return " ".join(text.split())
+
+
+@contextmanager
+def _exclusive_lock(path: str):
+    """Cross-process lock so concurrent merges from several workers do not overwrite each other."""
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _first(d: dict, keys) -> str | None:
+    for key in keys:
+        value = d.get(key)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+class ConceptGraphStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._mtime = None
+        self.nodes: dict[str, dict] = {}  # canonical -> {"label": str, "documents": set[str]}
+        self.edges: dict[tuple[str, str, str], set[str]] = {}  # (source, target, relation) -> documents
+        self.adjacency: dict[str, dict[str, set[str]]] = {}  # canonical -> neighbour -> relations (undirected)
+        self.outgoing: dict[str, dict[str, set[str]]] = {}  # source -> target -> relations (directed)
+        self.documents: set[str] = set()
+        self._load()
+
+    # -----------------------------
+    # Persistence
+    # -----------------------------
+    def _reset(self):
+        self.nodes, self.edges, self.adjacency, self.outgoing, self.documents = {}, {}, {}, {}, set()
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._reset()
+        for canonical, node in data.get("nodes", {}).items():
+            self.nodes[canonical] = {"label": node["label"], "documents": set(node["documents"])}
+            self.adjacency.setdefault(canonical, {})
+        for edge in data.get("edges", []):
+            self._index_edge(edge["source"], edge["target"], edge["relation"], set(edge["documents"]))
+        self.documents = set(data.get("documents", []))
+        self._mtime = mtime
+
+    def _maybe_reload(self):
+        """Pick up merges written by other workers (a stat() per query)."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self._load()
+
+    def save(self):
+        with self._lock:
+            data = {
+                "documents": sorted(self.documents),
+                "nodes": {c: {"label": n["label"], "documents": sorted(n["documents"])} for c, n in self.nodes.items()},
+                "edges": [
+                    {"source": s, "target": t, "relation": r, "documents": sorted(docs)}
+                    for (s, t, r), docs in self.edges.items()
+                ],
+            }
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self._mtime = os.path.getmtime(self.path)
+
+    # -----------------------------
+    # Merging
+    # -----------------------------
+    def _add_node(self, label: str, doc_id: str) -> str | None:
+        canonical = canonicalize(label)
+        if not canonical:
+            return None
+        node = self.nodes.setdefault(canonical, {"label": label.strip(), "documents": set()})
+        node["documents"].add(doc_id)
+        self.adjacency.setdefault(canonical, {})
+        return canonical
+
+    def _index_edge(self, source: str, target: str, relation: str, documents: set[str]):
+        self.edges.setdefault((source, target, relation), set()).update(documents)
+        self.outgoing.setdefault(source, {}).setdefault(target, set()).add(relation)
+        # Adjacency is undirected: a concept's neighbours include both ends of its edges
+        self.adjacency.setdefault(source, {}).setdefault(target, set()).add(relation)
+        self.adjacency.setdefault(target, {}).setdefault(source, set()).add(relation)
+
+    def add_graph(self, doc_id: str, graph: dict) -> bool:
+        """
+        Merge one document's {"nodes", "edges"} (as returned by generate_concept_graph).
+        Returns False if the document was already merged or the graph has no usable
+        concepts; such a document is not recorded, so a later, successful extraction
+        for it is still merged.
+        """
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # Reload, merge and write under one file lock: another worker's merge is
+        # either fully on disk before we read it or waits for ours
+        with self._lock, _exclusive_lock(self.path + ".lock"):
+            self._load()
+            if doc_id in self.documents:
+                return False
+            # LLM output uses either plain names or {"id": ..., "label": ...} objects, and
+            # edges may reference node ids rather than names
+            id_to_label = {}
+            merged = 0
+            for node in graph.get("nodes", []):
+                if isinstance(node, dict):
+                    label = _first(node, _NODE_NAME_KEYS)
+                    if label and node.get("id") not in (None, ""):
+                        id_to_label[str(node["id"])] = label
+                else:
+                    label = str(node)
+                if label and self._add_node(label, doc_id):
+                    merged += 1
+            for edge in graph.get("edges", []):
+                if isinstance(edge, dict):
+                    source, target = _first(edge, _EDGE_SOURCE_KEYS), _first(edge, _EDGE_TARGET_KEYS)
+                    relation = _first(edge, _EDGE_RELATION_KEYS) or "related_to"
+                elif isinstance(edge, (list, tuple)) and len(edge) >= 2:
+                    source, target = str(edge[0]), str(edge[-1])
+                    relation = str(edge[1]) if len(edge) >= 3 else "related_to"
+                else:
+                    continue
+                if not source or not target:
+                    continue
+                source = self._add_node(id_to_label.get(source, source), doc_id)
+                target = self._add_node(id_to_label.get(target, target), doc_id)
+                merged += bool(source) + bool(target)
+                if source and target and source != target:
+                    self._index_edge(source, target, relation, {doc_id})
+            if not merged:
+                return False
+            self.documents.add(doc_id)
+            self.save()
+            return True
+
+    # -----------------------------
+    # Queries
+    # -----------------------------
+    def _resolve(self, concept: str) -> str | None:
+        canonical = canonicalize(concept)
+        return canonical if canonical in self.nodes else None
+
+    def _node(self, canonical: str) -> dict:
+        node = self.nodes[canonical]
+        return {"id": canonical, "label": node["label"], "documents": len(node["documents"])}
+
+    def neighbors(self, concept: str) -> list[dict] | None:
+        with self._lock:
+            self._maybe_reload()
+            canonical = self._resolve(concept)
+            if canonical is None:
+                return None
+            return [
+                {**self._node(neighbour), "relations": sorted(relations)}
+                for neighbour, relations in self.adjacency[canonical].items()
+            ]
+
+    def subgraph(self, concept: str, k: int = 1, max_nodes: int = 200) -> dict | None:
+        """All concepts within k hops of concept (breadth-first, capped at max_nodes)."""
+        with self._lock:
+            self._maybe_reload()
+            start = self._resolve(concept)
+            if start is None:
+                return None
+            depth = {start: 0}
+            queue = deque([start])
+            while queue and len(depth) < max_nodes:
+                current = queue.popleft()
+                if depth[current] >= k:
+                    continue
+                for neighbour in self.adjacency[current]:
+                    if neighbour not in depth:
+                        depth[neighbour] = depth[current] + 1
+                        queue.append(neighbour)
+                        if len(depth) >= max_nodes:
+                            break
+            edges = [
+                {"source": source, "target": target, "relation": relation}
+                for source in depth
+                for target, relations in self.outgoing.get(source, {}).items()
+                if target in depth
+                for relation in sorted(relations)
+            ]
+            return {"nodes": [{**self._node(c), "depth": d} for c, d in depth.items()], "edges": edges}
+
+    def shortest_path(self, source: str, target: str) -> list[dict] | None:
+        """Fewest-hop path between two concepts, or None if either is unknown or they are disconnected."""
+        with self._lock:
+            self._maybe_reload()
+            start, goal = self._resolve(source), self._resolve(target)
+            if start is None or goal is None:
+                return None
+            parents = {start: None}
+            queue = deque([start])
+            while queue:
+                current = queue.popleft()
+                if current == goal:
+                    break
+                for neighbour in self.adjacency[current]:
+                    if neighbour not in parents:
+                        parents[neighbour] = current
+                        queue.append(neighbour)
+            if goal not in parents:
+                return None
+            path = []
+            node = goal
+            while node is not None:
+                path.append(node)
+                node = parents[node]
+            path.reverse()
+            return [
+                {**self._node(c), "relations_to_next": sorted(self.adjacency[c][n]) if n else []}
+                for c, n in zip(path, path[1:] + [None])
+            ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._maybe_reload()
+            return {"documents": len(self.documents), "nodes": len(self.nodes), "edges": len(self.edges)}
+
+
+concept_graph_store = ConceptGraphStore(os.getenv("GRAPH_STORE_PATH", os.path.join(".cache", "concept_graph.json")))
@@ -0,0 +1,118 @@
+# services/http_fetcher.py
+# Async page fetcher for the scraper: one pooled httpx client, a global
+# concurrency cap, per-host concurrency + politeness delay, and an on-disk
+# HTTP cache revalidated with conditional GETs (ETag / Last-Modified).
+import asyncio
+import os
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+from .disk_cache import DiskCache
+
+USER_AGENT = "Mozilla/5.0 (compatible; fastapi-app-scraper/1.0)"
+
+
+class AsyncFetcher:
+    def __init__(
+        self,
+        max_concurrency: int = 20,
+        per_host_concurrency: int = 4,
+        per_host_interval: float = 0.0,
+        timeout: float = 10.0,
+        cache: DiskCache | None = None,
+    ):
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_interval = per_host_interval
+        self.timeout = timeout
+        self.cache = cache
+        self._client = None
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        self._host_locks: dict[str, asyncio.Lock] = {}
+        self._host_next_start: dict[str, float] = {}
+        self._stats = {"requests": 0, "not_modified": 0, "cache_stored": 0}
+
+    @classmethod
+    def from_env(cls) -> "AsyncFetcher":
+        return cls(
+            max_concurrency=int(os.getenv("SCRAPE_MAX_CONCURRENCY", "20")),
+            per_host_concurrency=int(os.getenv("SCRAPE_PER_HOST_CONCURRENCY", "4")),
+            per_host_interval=float(os.getenv("SCRAPE_PER_HOST_INTERVAL", "0.2")),
+            timeout=float(os.getenv("SCRAPE_TIMEOUT", "10")),
+            cache=DiskCache(
+                os.getenv("HTTP_CACHE_DIR", os.path.join(".cache", "http")),
+                max_bytes=int(os.getenv("HTTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+            ),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                timeout=self.timeout,
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        return self._client
+
+    async def _wait_politely(self, host: str):
+        """Space out request starts to the same host by per_host_interval seconds."""
+        if self.per_host_interval <= 0:
+            return
+        lock = self._host_locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            delay = self._host_next_start.get(host, 0.0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._host_next_start[host] = time.monotonic() + self.per_host_interval
+
+    async def fetch(self, url: str) -> str:
+        """
+        GET url and return the body text. Raises httpx.HTTPError on failure.
+        Unchanged pages (304) are served from the HTTP cache without re-downloading.
+        """
+        cached = await asyncio.to_thread(self.cache.get, url) if self.cache else None
+        headers = {}
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        host = urlsplit(url).netloc
+        host_slots = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host_concurrency))
+        async with host_slots:
+            await self._wait_politely(host)
+            async with self._slots:
+                response = await self.client.get(url, headers=headers)
+        self._stats["requests"] += 1
+
+        if response.status_code == 304 and cached:
+            self._stats["not_modified"] += 1
+            return cached["body"]
+        response.raise_for_status()
+
+        etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if self.cache and (etag or last_modified):
+            entry = {"etag": etag, "last_modified": last_modified, "body": response.text}
+            await asyncio.to_thread(self.cache.set, url, entry)
+            self._stats["cache_stored"] += 1
+        return response.text
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        if self.cache:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Shared fetcher for web_scrape.py; closed by the app lifespan
+fetcher = AsyncFetcher.from_env()
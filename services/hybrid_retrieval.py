@@ -0,0 +1,196 @@
+# services/hybrid_retrieval.py
+# Hybrid retrieval for LlamaService: a BM25 inverted index over the indexed
+# chunks, fused with the vector retriever's similarities. Exact terms that
+# embeddings blur (names, IDs, skills such as "C++" or "node.js") are matched
+# by BM25, paraphrases are still matched by the vectors. Both score lists are
+# normalised to [0, 1] over the candidate set and mixed with weight alpha.
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+
+MODES = ("hybrid", "vector", "bm25")
+# Lowercased words, keeping the inner punctuation of terms like c++, c#, node.js, e-mail@x.com
+TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[.\-_/@][a-z0-9+#]+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 with the per-posting term weight precomputed at build time, so a
+    search is one NumPy scatter-add per query term.
+    """
+
+    def __init__(self, ids: list[str], texts: list[str], k1: float = 1.2, b: float = 0.75):
+        self.ids = list(ids)
+        counts = [Counter(tokenize(text)) for text in texts]
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) and lengths.mean() > 0 else 1.0
+
+        postings = defaultdict(lambda: ([], []))
+        for doc, terms in enumerate(counts):
+            for term, tf in terms.items():
+                postings[term][0].append(doc)
+                postings[term][1].append(tf)
+
+        n = len(self.ids)
+        self._postings: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for term, (docs, tfs) in postings.items():
+            docs = np.array(docs, dtype=np.int32)
+            tfs = np.array(tfs, dtype=np.float32)
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = k1 * (1 - b + b * lengths[docs] / avg_length)
+            self._postings[term] = (docs, (idf * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(self, query: str, top_k: int) -> list[tuple[str, float]]:
+        """(node_id, score) for the top_k chunks containing at least one query term."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        matched = np.flatnonzero(scores)
+        k = min(top_k, len(matched))
+        if k <= 0:
+            return []
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[i], float(scores[i])) for i in top]
+
+
+class HybridRetriever(BaseRetriever):
+    def __init__(
+        self,
+        index,
+        bm25: BM25Index,
+        similarity_top_k: int = 2,
+        alpha: float = 0.5,
+        mode: str = "hybrid",
+        cache=None,
+        index_version: str | None = None,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown retrieval mode {mode!r}, expected one of {', '.join(MODES)}")
+        super().__init__()
+        self._index = index
+        self._docstore = index.docstore
+        self._bm25 = bm25
+        self.similarity_top_k = similarity_top_k
+        self.alpha = alpha  # weight of the vector score; 1 - alpha goes to BM25
+        self.mode = mode
+        # Optional RetrievalCache for query embeddings and ranked hits of this index version
+        self._cache = cache
+        self.index_version = index_version
+        self._embed_model = Settings.embed_model
+        self._embed_model_name = getattr(self._embed_model, "model_name", type(self._embed_model).__name__)
+        self._vector_retriever = index.as_retriever(similarity_top_k=self._candidates(similarity_top_k))
+
+    @staticmethod
+    def _candidates(top_k: int) -> int:
+        # Each signal contributes a wider pool than the final top_k so fusion can reorder
+        return max(top_k * 4, 20)
+
+    def _vector_retriever_for(self, top_k: int):
+        if self._candidates(top_k) <= self._candidates(self.similarity_top_k):
+            return self._vector_retriever
+        return self._index.as_retriever(similarity_top_k=self._candidates(top_k))
+
+    def _fuse(self, query: str, vector_hits: list[NodeWithScore], top_k: int, mode: str) -> list[dict]:
+        hits: dict[str, dict] = {}
+        for item in vector_hits:
+            hits[item.node.node_id] = {"node": item.node, "vector_score": item.score or 0.0, "bm25_score": None}
+        if mode != "vector":
+            for node_id, score in self._bm25.search(query, self._candidates(top_k)):
+                hit = hits.setdefault(node_id, {"node": None, "vector_score": None, "bm25_score": None})
+                hit["bm25_score"] = score
+
+        vector_scores = [h["vector_score"] for h in hits.values() if h["vector_score"] is not None]
+        low, high = (min(vector_scores), max(vector_scores)) if vector_scores else (0.0, 0.0)
+        bm25_max = max((h["bm25_score"] for h in hits.values() if h["bm25_score"] is not None), default=0.0)
+        for hit in hits.values():
+            if mode == "vector":
+                hit["score"] = hit["vector_score"]
+            elif mode == "bm25":
+                hit["score"] = hit["bm25_score"]
+            else:
+                vector = 0.0
+                if hit["vector_score"] is not None:
+                    vector = (hit["vector_score"] - low) / (high - low) if high > low else 1.0
+                keyword = 0.0 if hit["bm25_score"] is None else hit["bm25_score"] / bm25_max
+                hit["score"] = self.alpha * vector + (1 - self.alpha) * keyword
+
+        ranked = sorted(hits.items(), key=lambda item: item[1]["score"], reverse=True)
+        results = []
+        for node_id, hit in ranked:
+            if hit["node"] is None:
+                hit["node"] = self._docstore.get_node(node_id, raise_error=False)
+                if hit["node"] is None:
+                    continue  # BM25 built from a docstore entry that is gone
+            results.append(hit)
+            if len(results) == top_k:
+                break
+        return results
+
+    def _cached_hits(self, query_bundle: QueryBundle, top_k: int, mode: str) -> list[dict] | None:
+        if self._cache is None:
+            return None
+        return self._cache.get_hits(self.index_version, query_bundle.query_str, mode, top_k)
+
+    def _store_hits(self, query_bundle: QueryBundle, top_k: int, mode: str, hits: list[dict]) -> list[dict]:
+        if self._cache is not None:
+            self._cache.set_hits(self.index_version, query_bundle.query_str, mode, top_k, hits)
+        return hits
+
+    def _cached_embedding(self, query_bundle: QueryBundle) -> bool:
+        """Fill query_bundle.embedding from the cache; False if it still has to be computed."""
+        if query_bundle.embedding is not None:
+            return True
+        if self._cache is not None:
+            query_bundle.embedding = self._cache.get_embedding(self._embed_model_name, query_bundle.query_str)
+        return query_bundle.embedding is not None
+
+    def _store_embedding(self, query_bundle: QueryBundle, embedding: list[float]):
+        query_bundle.embedding = embedding
+        if self._cache is not None:
+            self._cache.set_embedding(self._embed_model_name, query_bundle.query_str, embedding)
+
+    def search(self, query_bundle: QueryBundle, top_k: int | None = None, mode: str | None = None) -> list[dict]:
+        """Ranked hits: {"node", "score", "vector_score", "bm25_score"} (component scores None if absent)."""
+        mode, top_k = mode or self.mode, top_k or self.similarity_top_k
+        hits = self._cached_hits(query_bundle, top_k, mode)
+        if hits is not None:
+            return hits
+        vector_hits = []
+        if mode != "bm25":
+            if not self._cached_embedding(query_bundle):
+                self._store_embedding(query_bundle, self._embed_model.get_query_embedding(query_bundle.query_str))
+            vector_hits = self._vector_retriever_for(top_k).retrieve(query_bundle)
+        return self._store_hits(query_bundle, top_k, mode, self._fuse(query_bundle.query_str, vector_hits, top_k, mode))
+
+    async def asearch(self, query_bundle: QueryBundle, top_k: int | None = None, mode: str | None = None) -> list[dict]:
+        mode, top_k = mode or self.mode, top_k or self.similarity_top_k
+        hits = self._cached_hits(query_bundle, top_k, mode)
+        if hits is not None:
+            return hits
+        vector_hits = []
+        if mode != "bm25":
+            if not self._cached_embedding(query_bundle):
+                self._store_embedding(query_bundle, await self._embed_model.aget_query_embedding(query_bundle.query_str))
+            vector_hits = await self._vector_retriever_for(top_k).aretrieve(query_bundle)
+        return self._store_hits(query_bundle, top_k, mode, self._fuse(query_bundle.query_str, vector_hits, top_k, mode))
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        return [NodeWithScore(node=hit["node"], score=hit["score"]) for hit in self.search(query_bundle)]
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        return [NodeWithScore(node=hit["node"], score=hit["score"]) for hit in await self.asearch(query_bundle)]
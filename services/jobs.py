@@ -0,0 +1,249 @@
+# services/jobs.py
+# In-process background jobs for long-running generation (images, video,
+# document summaries): a priority queue drained by a bounded worker pool.
+# Each job gets an ID that can be polled; its record is written to
+# JOBS_DIR/<job_id>/job.json on submit and on every state change, so any
+# uvicorn worker sharing JOBS_DIR can answer a poll. Results (metadata +
+# files) live in the same directory and are removed after JOBS_RESULT_TTL
+# seconds, so they can be fetched by URL any number of times until then.
+import asyncio
+import itertools
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable
+
+# Lower number = served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 10
+
+JOB_FILE = "job.json"
+# Records of jobs that never finished (their worker process died) are kept this long
+UNFINISHED_TTL = 24 * 3600
+_SAFE_NAME_RE = re.compile(r"^[\w][\w.-]*$")
+
+
+class QueueFull(Exception):
+    pass
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    priority: int
+    status: str = "queued"  # queued | running | succeeded | failed
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: dict | None = None
+    error: str | None = None
+    files: list[str] = field(default_factory=list)
+    params: dict = field(default_factory=dict, repr=False)
+
+    def public(self) -> dict:
+        data = asdict(self)
+        del data["params"]
+        return data
+
+
+# Handlers receive the job and the JobQueue (to save files) and return the result dict
+Handler = Callable[[Job, "JobQueue"], Awaitable[dict]]
+# Discard hooks release the inputs of a job that will never run (e.g. delete an uploaded temp file)
+Discard = Callable[[Job], None]
+
+
+class JobQueue:
+    def __init__(self, directory: str, workers: int = 2, max_queued: int = 100, result_ttl: float = 3600.0):
+        self.directory = directory
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self._handlers: dict[str, Handler] = {}
+        self._discards: dict[str, Discard] = {}
+        self._jobs: dict[str, Job] = {}
+        self._queue: asyncio.PriorityQueue | None = None
+        self._seq = itertools.count()  # FIFO within a priority
+        self._tasks: list[asyncio.Task] = []
+        self._stats = {"submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0, "expired": 0}
+
+    @classmethod
+    def from_env(cls) -> "JobQueue":
+        return cls(
+            os.getenv("JOBS_DIR", os.path.join(".cache", "jobs")),
+            workers=int(os.getenv("JOBS_WORKERS", "2")),
+            max_queued=int(os.getenv("JOBS_MAX_QUEUED", "100")),
+            result_ttl=float(os.getenv("JOBS_RESULT_TTL", "3600")),
+        )
+
+    def register(self, kind: str, handler: Handler, discard: Discard | None = None):
+        self._handlers[kind] = handler
+        if discard is not None:
+            self._discards[kind] = discard
+
+    # Lifecycle (called from the app lifespan)
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._cleanup_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs that were queued or interrupted will never finish: fail them so pollers stop
+        # waiting, and let queued ones release their inputs (running handlers clean up their own)
+        for job in self._jobs.values():
+            if job.status not in ("queued", "running"):
+                continue
+            if job.status == "queued" and job.kind in self._discards:
+                try:
+                    self._discards[job.kind](job)
+                except Exception as e:
+                    print(f"⚠️ Could not discard inputs of job {job.id}: {e}")
+            job.status, job.error, job.finished_at = "failed", "Server shut down before the job finished", time.time()
+            await asyncio.to_thread(self._persist, job)
+
+    def submit(self, kind: str, params: dict | None = None, priority: int = PRIORITY_NORMAL) -> Job:
+        """Queue a job and return it immediately. Raises QueueFull when too many jobs are waiting."""
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        if self._queue.qsize() >= self.max_queued:
+            self._stats["rejected"] += 1
+            raise QueueFull(f"{self._queue.qsize()} jobs already queued")
+        job = Job(id=uuid.uuid4().hex, kind=kind, priority=priority, params=params or {})
+        # Written before the ID is handed out, so a poll that lands on another worker finds it
+        self._persist(job)
+        self._jobs[job.id] = job
+        self._queue.put_nowait((priority, next(self._seq), job.id))
+        self._stats["submitted"] += 1
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        """Jobs of this process first, then records on disk (other workers, or before a restart)."""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        if not _SAFE_NAME_RE.match(job_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, job_id, JOB_FILE), "r", encoding="utf-8") as f:
+                return Job(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def job_dir(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id)
+
+    def save_file(self, job: Job, name: str, data: bytes) -> str:
+        """Store a result file for the job and return its file name."""
+        if not _SAFE_NAME_RE.match(name):
+            raise ValueError(f"Invalid result file name: {name}")
+        directory = self.job_dir(job.id)
+        os.makedirs(directory, exist_ok=True)
+        _atomic_write(os.path.join(directory, name), data)
+        job.files.append(name)
+        return name
+
+    def file_path(self, job_id: str, name: str) -> str | None:
+        if not (_SAFE_NAME_RE.match(job_id) and _SAFE_NAME_RE.match(name)) or name == JOB_FILE:
+            return None
+        path = os.path.join(self.directory, job_id, name)
+        return path if os.path.isfile(path) else None
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            job.status, job.started_at = "running", time.time()
+            await asyncio.to_thread(self._persist, job)
+            try:
+                job.result = await self._handlers[job.kind](job, self)
+                job.status = "succeeded"
+                self._stats["succeeded"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.status, job.error = "failed", str(e) or type(e).__name__
+                self._stats["failed"] += 1
+            job.finished_at = time.time()
+            await asyncio.to_thread(self._persist, job)
+
+    def _persist(self, job: Job):
+        directory = self.job_dir(job.id)
+        os.makedirs(directory, exist_ok=True)
+        data = asdict(job)
+        data["params"] = {}  # inputs (prompts, temp file paths) stay in the submitting process only
+        _atomic_write(os.path.join(directory, JOB_FILE), json.dumps(data).encode("utf-8"))
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(min(60.0, self.result_ttl))
+            await self.cleanup()
+
+    async def cleanup(self):
+        """Forget finished jobs and delete their files once they are older than result_ttl."""
+        cutoff = time.time() - self.result_ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < cutoff:
+                del self._jobs[job_id]
+        self._stats["expired"] += await asyncio.to_thread(self._remove_expired, cutoff, set(self._jobs))
+
+    def _remove_expired(self, cutoff: float, live: set[str]) -> int:
+        removed = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        for entry in entries:
+            if not entry.is_dir() or entry.name in live or entry.stat().st_mtime >= cutoff:
+                continue
+            # Another worker may still own a queued or running job here; only its record says so
+            try:
+                with open(os.path.join(entry.path, JOB_FILE), "r", encoding="utf-8") as f:
+                    finished_at = json.load(f).get("finished_at")
+            except (OSError, ValueError):
+                finished_at = None
+            if finished_at is None:
+                expired = entry.stat().st_mtime < time.time() - UNFINISHED_TTL
+            else:
+                expired = finished_at < cutoff
+            if not expired:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize() if self._queue is not None else 0
+        stats["running"] = sum(1 for job in self._jobs.values() if job.status == "running")
+        stats["workers"] = self.workers
+        return stats
+
+
+def _atomic_write(path: str, data: bytes):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+# Shared job queue; handlers are registered by main.py and workers run in the app lifespan
+job_queue = JobQueue.from_env()
@@ -0,0 +1,226 @@
+# services/metrics.py
+# Minimal in-process metrics with Prometheus text exposition (no client
+# library needed). Recording is a dict lookup, a bisect and a few integer
+# adds under an uncontended lock; all formatting happens at scrape time.
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; covers fast cache hits up to slow generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)  # first bucket with upper bound >= value
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # per-bucket (non-cumulative) counts + overflow, then sum and count
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self._header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        # Callbacks returning {metric_name: (documentation, {labels_tuple: value}, labelnames)}
+        # evaluated at scrape time, for values other components already track (cache stats)
+        self._collectors = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for collector in self._collectors:
+            try:
+                collected = collector()
+            except Exception:
+                continue  # a broken collector must not take the whole scrape down
+            for name, (documentation, values, labelnames) in collected.items():
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge"]
+                lines += [f"{name}{_labels(labelnames, k)} {_number(v)}" for k, v in values.items()]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter("http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status"))
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency until the last body byte, by route", ("route", "method")
+)
+http_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being served")
+upstream_duration = registry.histogram(
+    "upstream_request_duration_seconds", "Latency of calls to LLM/image providers", ("provider", "model", "outcome")
+)
+stream_ttft = registry.histogram(
+    "stream_time_to_first_token_seconds", "Time to first streamed chunk on the SSE endpoints", ("provider",)
+)
+tokens = registry.counter("llm_tokens_total", "Tokens reported by provider usage fields", ("provider", "model", "kind"))
+
+
+def _split_name(name: str) -> tuple[str, str]:
+    provider, _, model = name.partition(":")
+    return provider, model or "default"
+
+
+@contextmanager
+def track_upstream(provider: str, model: str):
+    """Time an upstream provider call; the outcome label is "ok" or "error"."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        upstream_duration.observe(time.perf_counter() - start, provider, model, outcome)
+
+
+def observe_upstream(name: str, seconds: float, ok: bool):
+    """Record a call already timed elsewhere; name is "provider:model"."""
+    provider, model = _split_name(name)
+    upstream_duration.observe(seconds, provider, model, "ok" if ok else "error")
+
+
+def record_usage(provider: str, model: str | None, input_tokens: int | None, output_tokens: int | None):
+    model = model or "default"
+    if input_tokens:
+        tokens.inc(provider, model, "input", amount=input_tokens)
+    if output_tokens:
+        tokens.inc(provider, model, "output", amount=output_tokens)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware overhead, streaming untouched).
+    Latency is measured until the response body is complete, so for SSE it is
+    the full stream duration; the route label is the matched path template.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners cannot blow up the series count
+            label = getattr(route, "path", None) or "unmatched"
+            http_request_duration.observe(time.perf_counter() - start, label, scope["method"])
+            http_requests.inc(label, scope["method"], str(status[0]))
@@ -0,0 +1,281 @@
+# services/mmap_vector_store.py
+# Embedding store for LlamaService that keeps every vector in one contiguous
+# file, memory-mapped read-only by each uvicorn worker. The pages live once in
+# the OS page cache and are shared by all workers, instead of every process
+# holding its own copy of the SimpleVectorStore JSON. Vectors are normalised
+# on write, so cosine similarity is a plain dot product computed with NumPy
+# over the mapping block by block.
+#
+# Only the embeddings are shared. Each worker still loads the index docstore
+# (node text + metadata) and builds its own BM25 postings from it, so
+# per-worker memory still grows with the corpus, at roughly the size of the
+# extracted text rather than text + a float32 vector per chunk.
+#
+# File layout (sections 64-byte aligned):
+#   magic | format version, header length (u32, u32) | JSON header
+#   vectors  count x dim  float32 | float16 | int8
+#   scales   count        float32, int8 only (row = int8 values * scale)
+#   ids      count        node ids, fixed-width bytes
+#   refs     count        ref_doc ids, for delete() and doc_ids filters
+#
+# Changes are held by the writer until persist(), which writes a new file
+# next to the old one and os.replace()s it in: readers see the old or the new
+# generation, never a partial one, and a mapping that is already open keeps
+# the old inode. Only one process should write at a time (LlamaService holds
+# a file lock while refreshing the index).
+import asyncio
+import json
+import mmap
+import os
+import struct
+from typing import Any, List, Sequence
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+MAGIC = b"MMVSTORE"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<II")
+ALIGN = 64
+DTYPES = ("float32", "float16", "int8")
+# Rows scored per NumPy call; bounds the temporary float32 copy made for float16/int8 blocks
+SEARCH_BLOCK_ROWS = 2048
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def _quantize(vectors: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """Convert normalised float32 rows to the storage dtype; int8 gets one scale per row."""
+    if dtype != "int8":
+        return vectors.astype(dtype), None
+    scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, np.float32)
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def _layout(header: dict, start: int) -> dict:
+    """Byte offset of each section, given where the data starts after the header."""
+    count, dim = header["count"], header["dim"]
+    offsets = {"vectors": start}
+    offset = _aligned(start + count * dim * np.dtype(header["dtype"]).itemsize)
+    if header["dtype"] == "int8":
+        offsets["scales"] = offset
+        offset = _aligned(offset + count * 4)
+    offsets["ids"] = offset
+    offsets["refs"] = _aligned(offset + count * header["id_width"])
+    return offsets
+
+
+def _encode(values: list[str]) -> np.ndarray:
+    encoded = [value.encode("utf-8") for value in values]
+    return np.array(encoded, dtype=f"S{max((len(v) for v in encoded), default=1) or 1}")
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """
+    llama_index vector store over a memory-mapped embedding file. Node text and
+    metadata stay in the index docstore (stores_text = False); this only maps
+    node ids to vectors, so metadata filters are not supported.
+    """
+
+    stores_text: bool = False
+    path: str
+    dtype: str = "float32"
+
+    # Arrays over the current file's mapping: vectors, scales, ids, refs
+    _data: dict | None = PrivateAttr(default=None)
+    # Writer-side float32 copy with changes not yet persisted: ids, refs, rows
+    _pending: dict | None = PrivateAttr(default=None)
+
+    def __init__(self, path: str, dtype: str = "float32", **kwargs: Any):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype {dtype!r}, expected one of {', '.join(DTYPES)}")
+        super().__init__(path=path, dtype=dtype, **kwargs)
+        self._data = self._open()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    # -----------------------------
+    # Reading
+    # -----------------------------
+    def _open(self) -> dict | None:
+        try:
+            with open(self.path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        if mapped[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a vector store file")
+        version, header_length = PREAMBLE.unpack_from(mapped, len(MAGIC))
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{self.path} has format version {version}, expected {FORMAT_VERSION}")
+        header_start = len(MAGIC) + PREAMBLE.size
+        header = json.loads(mapped[header_start : header_start + header_length])
+        count, dim = header["count"], header["dim"]
+        if count == 0:
+            return None
+
+        # Zero-copy views; nothing is read from disk until a query touches the pages
+        offsets = _layout(header, _aligned(header_start + header_length))
+        data = {
+            "vectors": np.frombuffer(mapped, header["dtype"], count * dim, offsets["vectors"]).reshape(count, dim),
+            "scales": None,
+            "ids": np.frombuffer(mapped, f"S{header['id_width']}", count, offsets["ids"]),
+            "refs": np.frombuffer(mapped, f"S{header['ref_width']}", count, offsets["refs"]),
+        }
+        if "scales" in offsets:
+            data["scales"] = np.frombuffer(mapped, np.float32, count, offsets["scales"])
+        return data
+
+    def _pending_data(self) -> dict | None:
+        pending = self._pending
+        if not pending["ids"]:
+            return None
+        return {
+            "vectors": np.stack(pending["rows"]),
+            "scales": None,
+            "ids": _encode(pending["ids"]),
+            "refs": _encode(pending["refs"]),
+        }
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise ValueError("MmapVectorStore does not store metadata; metadata filters are not supported")
+        data = self._pending_data() if self._pending is not None else self._data
+        if data is None or query.query_embedding is None:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        vectors, count = data["vectors"], len(data["ids"])
+        embedding = _normalize(np.asarray(query.query_embedding, dtype=np.float32))
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            block = vectors[start : start + SEARCH_BLOCK_ROWS]
+            scores[start : start + len(block)] = block.astype(np.float32, copy=False) @ embedding
+        if data["scales"] is not None:
+            scores *= data["scales"]
+
+        if query.doc_ids:
+            scores[~np.isin(data["refs"], _encode(query.doc_ids))] = -np.inf
+        if query.node_ids:
+            scores[~np.isin(data["ids"], _encode(query.node_ids))] = -np.inf
+
+        k = min(query.similarity_top_k, count)
+        if k <= 0:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        top = top[np.isfinite(scores[top])]
+        return VectorStoreQueryResult(
+            similarities=scores[top].tolist(),
+            ids=[data["ids"][i].decode("utf-8") for i in top],
+        )
+
+    async def aquery(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        # Scoring is CPU-bound over the whole corpus; keep it off the event loop
+        return await asyncio.to_thread(self.query, query, **kwargs)
+
+    # -----------------------------
+    # Writing
+    # -----------------------------
+    def _materialize(self) -> dict:
+        """Start (or continue) a write: copy the mapped vectors into an editable float32 list."""
+        if self._pending is None:
+            data = self._data
+            if data is None:
+                self._pending = {"ids": [], "refs": [], "rows": []}
+            else:
+                vectors = data["vectors"].astype(np.float32)
+                if data["scales"] is not None:
+                    vectors *= data["scales"][:, None]
+                self._pending = {
+                    "ids": [value.decode("utf-8") for value in data["ids"]],
+                    "refs": [value.decode("utf-8") for value in data["refs"]],
+                    "rows": list(vectors),
+                }
+        return self._pending
+
+    def clear(self) -> None:
+        """Drop every vector; takes effect on disk at the next persist()."""
+        self._pending = {"ids": [], "refs": [], "rows": []}
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        pending = self._materialize()
+        dim = len(pending["rows"][0]) if pending["rows"] else None
+        for node in nodes:
+            row = _normalize(np.asarray(node.get_embedding(), dtype=np.float32))
+            if dim is not None and len(row) != dim:
+                raise ValueError(f"Embedding has {len(row)} dimensions, the store holds {dim}")
+            dim = len(row)
+            pending["ids"].append(node.node_id)
+            pending["refs"].append(node.ref_doc_id or "")
+            pending["rows"].append(row)
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        pending = self._materialize()
+        keep = [i for i, ref in enumerate(pending["refs"]) if ref != ref_doc_id]
+        for key in ("ids", "refs", "rows"):
+            pending[key] = [pending[key][i] for i in keep]
+
+    def persist(self, persist_path: str | None = None, fs: Any = None) -> None:
+        """
+        Write pending changes to self.path. persist_path (the per-namespace JSON
+        path StorageContext.persist passes in) is ignored: the file location is
+        fixed when the store is created.
+        """
+        if self._pending is None and self.exists:
+            return
+        pending = self._materialize()
+        rows = pending["rows"]
+        vectors, scales = _quantize(np.stack(rows) if rows else np.zeros((0, 0), np.float32), self.dtype)
+        ids, refs = _encode(pending["ids"]), _encode(pending["refs"])
+        header = {
+            "dtype": self.dtype,
+            "dim": vectors.shape[1],
+            "count": len(rows),
+            "id_width": ids.dtype.itemsize,
+            "ref_width": refs.dtype.itemsize,
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+        header_start = len(MAGIC) + PREAMBLE.size
+        offsets = _layout(header, _aligned(header_start + len(header_bytes)))
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC + PREAMBLE.pack(FORMAT_VERSION, len(header_bytes)) + header_bytes)
+            for name, array in (("vectors", vectors), ("scales", scales), ("ids", ids), ("refs", refs)):
+                if array is not None and len(array):
+                    f.seek(offsets[name])
+                    f.write(np.ascontiguousarray(array).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+        self._pending = None
+        self._data = self._open()
+        print(f"💾 Vector store written: {header['count']} vectors, {self.dtype}, {os.path.getsize(self.path)} bytes")
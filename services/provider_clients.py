@@ -0,0 +1,113 @@
+# services/provider_clients.py
+# One set of long-lived async clients per worker, shared by every endpoint.
+# Each client keeps its own keep-alive connection pool, so repeat calls to a
+# provider skip the TCP/TLS handshake. Opened and closed by the app lifespan.
+import asyncio
+import inspect
+import os
+import threading
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("PROVIDER_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("PROVIDER_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("PROVIDER_KEEPALIVE_EXPIRY", "30")),
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        float(os.getenv("PROVIDER_TIMEOUT", "60")),
+        connect=float(os.getenv("PROVIDER_CONNECT_TIMEOUT", "10")),
+    )
+
+
+def _pooled_http_client(**kwargs) -> httpx.AsyncClient:
+    return httpx.AsyncClient(limits=_limits(), timeout=_timeout(), **kwargs)
+
+
+class ProviderClients:
+    """
+    Registry of shared async provider clients.
+    Clients are created on first use (or eagerly by startup()) and reused afterwards.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()  # startup() builds clients in a worker thread
+
+    def _get(self, name: str, factory):
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = factory()
+        return client
+
+    @property
+    def openai(self):
+        from openai import AsyncOpenAI
+
+        return self._get("openai", lambda: AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=_pooled_http_client(),
+        ))
+
+    @property
+    def perplexity(self):
+        from openai import AsyncOpenAI
+
+        return self._get("perplexity", lambda: AsyncOpenAI(
+            api_key=os.getenv("PERPLEXITY_API_KEY"),
+            base_url=os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai"),
+            http_client=_pooled_http_client(),
+        ))
+
+    @property
+    def anthropic(self):
+        from anthropic import AsyncAnthropic
+
+        return self._get("anthropic", lambda: AsyncAnthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            http_client=_pooled_http_client(),
+        ))
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Plain pooled HTTP client for REST providers without an SDK (Gemini)."""
+        return self._get("http", _pooled_http_client)
+
+    async def startup(self) -> None:
+        """
+        Open clients for every provider that has credentials configured. The SDK
+        imports are slow, so they run in a worker thread off the event loop.
+        """
+        names = ["http"]
+        for name, key_var in [("openai", "OPENAI_API_KEY"), ("anthropic", "ANTHROPIC_API_KEY"), ("perplexity", "PERPLEXITY_API_KEY")]:
+            if os.getenv(key_var):
+                names.append(name)
+        await asyncio.to_thread(lambda: [getattr(self, name) for name in names])
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            try:
+                if isinstance(client, httpx.AsyncClient):
+                    await client.aclose()
+                else:
+                    result = client.close()
+                    if inspect.isawaitable(result):
+                        await result
+            except Exception as e:
+                print(f"⚠️ Error closing provider client: {e}")
+
+
+# Shared registry; main.py opens/closes it in the app lifespan
+provider_clients = ProviderClients()
@@ -0,0 +1,213 @@
+# services/provider_router.py
+# Shared failover for provider/model candidates:
+#   - rolling p50/p95 latency and error rate per candidate
+#   - circuit breaker that skips a candidate after repeated failures
+#   - hedging: if the primary runs past its p95, the next candidate is started
+#     too; the first success wins and the loser is cancelled
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from .metrics import observe_upstream
+
+
+@dataclass
+class Candidate:
+    name: str  # "provider:model", the key stats and breakers are tracked under
+    call: Callable[[], Awaitable[Any]]
+
+
+class AllCandidatesFailed(Exception):
+    def __init__(self, errors: list[tuple[str, BaseException]]):
+        self.errors = errors
+        super().__init__("; ".join(f"{name}: {error}" for name, error in errors) or "No candidates available")
+
+    @property
+    def last_error(self) -> BaseException | None:
+        return self.errors[-1][1] if self.errors else None
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class CandidateStats:
+    def __init__(self, window: int, failure_threshold: int, cooldown: float):
+        self.latencies = deque(maxlen=window)  # successful call durations (seconds)
+        self.outcomes = deque(maxlen=window)  # True = success
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.consecutive_failures = 0
+        self.opened_at = None  # set while the breaker is open
+        self.probing = False  # a half-open trial call is in flight
+
+    # Circuit breaker: closed -> open after N consecutive failures -> half-open after cooldown
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state()
+        return state == "closed" or (state == "half_open" and not self.probing)
+
+    def started(self):
+        if self.state() == "half_open":
+            self.probing = True
+
+    def record(self, ok: bool, latency: float):
+        self.outcomes.append(ok)
+        self.probing = False
+        if ok:
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            self.opened_at = None
+        else:
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold or self.state() == "half_open":
+                self.opened_at = time.monotonic()
+
+    def percentile(self, q: float) -> float | None:
+        if not self.latencies:
+            return None
+        return _percentile(sorted(self.latencies), q)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.latencies)
+        return {
+            "state": self.state(),
+            "samples": len(self.outcomes),
+            "error_rate": (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0,
+            "p50_ms": round(_percentile(ordered, 0.50) * 1000, 1) if ordered else None,
+            "p95_ms": round(_percentile(ordered, 0.95) * 1000, 1) if ordered else None,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class ProviderRouter:
+    def __init__(
+        self,
+        window: int = 200,
+        failure_threshold: int = 5,
+        cooldown: float = 30.0,
+        hedge_min_samples: int = 20,
+        hedge_min_delay: float = 0.25,
+    ):
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self._stats: dict[str, CandidateStats] = {}
+        self.hedges_started = 0
+        self.hedges_won = 0
+
+    @classmethod
+    def from_env(cls) -> "ProviderRouter":
+        return cls(
+            window=int(os.getenv("ROUTER_WINDOW", "200")),
+            failure_threshold=int(os.getenv("ROUTER_FAILURE_THRESHOLD", "5")),
+            cooldown=float(os.getenv("ROUTER_COOLDOWN", "30")),
+            hedge_min_samples=int(os.getenv("ROUTER_HEDGE_MIN_SAMPLES", "20")),
+            hedge_min_delay=float(os.getenv("ROUTER_HEDGE_MIN_DELAY", "0.25")),
+        )
+
+    def stats_for(self, name: str) -> CandidateStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = CandidateStats(self.window, self.failure_threshold, self.cooldown)
+        return stats
+
+    def _hedge_delay(self, name: str) -> float | None:
+        """Seconds to wait on a candidate before hedging; None until its p95 is known."""
+        stats = self.stats_for(name)
+        if len(stats.latencies) < self.hedge_min_samples:
+            return None
+        return max(stats.percentile(0.95), self.hedge_min_delay)
+
+    async def _timed(self, candidate: Candidate, is_fatal: Callable[[BaseException], bool] | None = None):
+        stats = self.stats_for(candidate.name)
+        stats.started()
+        start = time.perf_counter()
+        try:
+            result = await candidate.call()
+        except asyncio.CancelledError:
+            stats.probing = False
+            raise  # a cancelled hedge loser says nothing about the candidate's health
+        except BaseException as e:
+            if is_fatal and is_fatal(e):
+                # The caller's fault (bad request, content policy): the provider is healthy,
+                # so a few bad prompts must not open the breaker for everyone else
+                stats.probing = False
+                observe_upstream(candidate.name, time.perf_counter() - start, ok=False)
+                raise
+            stats.record(False, time.perf_counter() - start)
+            observe_upstream(candidate.name, time.perf_counter() - start, ok=False)
+            raise
+        stats.record(True, time.perf_counter() - start)
+        observe_upstream(candidate.name, time.perf_counter() - start, ok=True)
+        return result
+
+    async def call(self, candidates: list[Candidate], hedge: bool = True, is_fatal: Callable[[BaseException], bool] | None = None):
+        """
+        Run candidates in preference order and return the first successful result.
+        Candidates with an open breaker are skipped (all of them are tried if every breaker is open).
+        A failure moves on to the next candidate immediately unless is_fatal(error) says
+        retrying elsewhere is pointless, in which case the error is raised as-is.
+        Raises AllCandidatesFailed when every candidate fails.
+        """
+        queue = deque([c for c in candidates if self.stats_for(c.name).allow()] or candidates)
+        running: dict[asyncio.Task, Candidate] = {}
+        hedged: set[asyncio.Task] = set()
+        errors: list[tuple[str, BaseException]] = []
+
+        def launch() -> asyncio.Task:
+            candidate = queue.popleft()
+            task = asyncio.create_task(self._timed(candidate, is_fatal))
+            running[task] = candidate
+            return task
+
+        try:
+            newest = launch()
+            while running:
+                # Hedge against the most recently started candidate once it passes its p95
+                delay = self._hedge_delay(running[newest].name) if hedge and queue and newest in running else None
+                done, _ = await asyncio.wait(running, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges_started += 1
+                    newest = launch()
+                    hedged.add(newest)
+                    continue
+                for task in done:
+                    candidate = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if task in hedged:
+                            self.hedges_won += 1
+                        return task.result()
+                    if is_fatal and is_fatal(error):
+                        raise error
+                    errors.append((candidate.name, error))
+                if not running and queue:
+                    newest = launch()
+            raise AllCandidatesFailed(errors)
+        finally:
+            for task in running:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "candidates": {name: stats.snapshot() for name, stats in self._stats.items()},
+            "hedges_started": self.hedges_started,
+            "hedges_won": self.hedges_won,
+        }
+
+
+# Shared router; every provider/model fallback chain goes through it
+provider_router = ProviderRouter.from_env()
@@ -0,0 +1,71 @@
+# services/readiness.py
+# Startup work that would otherwise delay the server from listening (SDK
+# imports, building the RAG index) runs as background tasks; this tracks
+# each subsystem's state for the /ready probe and for endpoints that need
+# a subsystem before it has finished loading.
+import asyncio
+import time
+
+
+class Readiness:
+    def __init__(self):
+        self._subsystems: dict[str, dict] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self, name: str, coro, thread: bool = False) -> asyncio.Task:
+        """Run coro in the background and record name as starting -> ready | failed."""
+        self._subsystems[name] = {"status": "starting", "started_at": time.time(), "seconds": None, "error": None, "thread": thread}
+        task = asyncio.create_task(self._run(name, coro))
+        self._tasks.append(task)
+        return task
+
+    def start_in_thread(self, name: str, fn, *args) -> asyncio.Task:
+        """start() for blocking work: fn(*args) runs in a worker thread."""
+        return self.start(name, asyncio.to_thread(fn, *args), thread=True)
+
+    async def _run(self, name: str, coro):
+        state = self._subsystems[name]
+        start = time.perf_counter()
+        try:
+            await coro
+            state["status"] = "ready"
+            print(f"✅ {name} ready in {time.perf_counter() - start:.1f}s")
+        except asyncio.CancelledError:
+            state["status"] = "abandoned" if state["thread"] else "cancelled"
+            raise
+        except Exception as e:
+            state["status"], state["error"] = "failed", str(e) or type(e).__name__
+            print(f"❌ {name} failed to start: {state['error']}")
+        finally:
+            state["seconds"] = round(time.perf_counter() - start, 3)
+
+    def status(self, name: str) -> str | None:
+        state = self._subsystems.get(name)
+        return state["status"] if state else None
+
+    def is_ready(self, name: str) -> bool:
+        return self.status(name) == "ready"
+
+    def error(self, name: str) -> str | None:
+        state = self._subsystems.get(name)
+        return state["error"] if state else None
+
+    def snapshot(self) -> dict:
+        subsystems = {name: dict(state) for name, state in self._subsystems.items()}
+        return {"ready": all(s["status"] == "ready" for s in subsystems.values()), "subsystems": subsystems}
+
+    async def stop(self):
+        """
+        Cancel the startup tasks that are still running. For start_in_thread()
+        subsystems only the awaiting wrapper is cancelled: a thread cannot be
+        interrupted, so it runs to completion (an index build keeps going, and
+        keeps its file lock, until it finishes) and the status reads "abandoned".
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Shared instance; subsystems are started from the app lifespan
+readiness = Readiness()
@@ -0,0 +1,198 @@
+# services/response_cache.py
+# Two-tier cache in front of the text-generation providers:
+#   1. exact tier    - LRU + TTL, keyed by a normalized (provider, model, messages, params) tuple
+#   2. semantic tier - optional embedding nearest-neighbour lookup over recent prompts
+import asyncio
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(str(text).split())
+
+
+def _normalize_messages(messages: list[dict]) -> list[dict]:
+    return [{"role": m.get("role", "user"), "content": _normalize_text(m.get("content", ""))} for m in messages]
+
+
+def _cosine(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _openai_embedder(model: str):
+    """Build an embedding function backed by the OpenAI embeddings API."""
+    from openai import OpenAI
+
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+    def embed(text: str) -> list[float]:
+        return client.embeddings.create(model=model, input=text).data[0].embedding
+
+    return embed
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: float = 3600,
+        semantic: bool = False,
+        similarity_threshold: float = 0.95,
+        max_semantic_entries: int = 512,
+        embed_fn=None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic = semantic
+        self.similarity_threshold = similarity_threshold
+        self.max_semantic_entries = max_semantic_entries
+        self._embed_fn = embed_fn
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()  # key -> (expires_at, value)
+        self._vectors: OrderedDict[str, tuple[str, list[float]]] = OrderedDict()  # key -> (scope, embedding)
+        self._recent_embeddings: OrderedDict[str, list[float]] = OrderedDict()  # avoids re-embedding on set()
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0}
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+            ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+            semantic=os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes"),
+            similarity_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95")),
+            max_semantic_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "512")),
+        )
+
+    # -----------------------------
+    # Keys
+    # -----------------------------
+    @staticmethod
+    def _scope(provider: str, model: str, params: dict) -> str:
+        """Everything except the prompt text: semantic matches never cross scopes."""
+        return json.dumps([provider, model, params], sort_keys=True, default=str)
+
+    @staticmethod
+    def make_key(provider: str, model: str, messages: list[dict], params: dict | None = None) -> str:
+        payload = json.dumps(
+            [provider, model, _normalize_messages(messages), params or {}], sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _embed(self, messages: list[dict]) -> list[float] | None:
+        if self._embed_fn is None:
+            self._embed_fn = _openai_embedder(os.getenv("SEMANTIC_CACHE_EMBED_MODEL", "text-embedding-3-small"))
+        text = "\n".join(m["content"] for m in _normalize_messages(messages))
+        with self._lock:
+            vector = self._recent_embeddings.get(text)
+        if vector is not None:
+            return vector
+        try:
+            vector = self._embed_fn(text)
+        except Exception:
+            # The semantic tier is best-effort; an embedding failure just means a miss
+            return None
+        with self._lock:
+            self._recent_embeddings[text] = vector
+            while len(self._recent_embeddings) > 64:
+                self._recent_embeddings.popitem(last=False)
+        return vector
+
+    # -----------------------------
+    # Lookup / store
+    # -----------------------------
+    def _get_exact(self, key: str, now: float) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < now:
+            self._entries.pop(key, None)
+            self._vectors.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get(self, provider: str, model: str, messages: list[dict], params: dict | None = None) -> str | None:
+        """Return a cached response, or None. Call set() after a miss to populate both tiers."""
+        params = params or {}
+        key = self.make_key(provider, model, messages, params)
+        with self._lock:
+            value = self._get_exact(key, time.monotonic())
+            if value is not None:
+                self._stats["exact_hits"] += 1
+                return value
+            if not self.semantic or not self._vectors:
+                self._stats["misses"] += 1
+                return None
+
+        # Embedding is a network call: do it outside the lock
+        vector = self._embed(messages)
+        scope = self._scope(provider, model, params)
+        with self._lock:
+            best_key, best_score = None, self.similarity_threshold
+            if vector is not None:
+                for candidate_key, (candidate_scope, candidate_vector) in self._vectors.items():
+                    if candidate_scope != scope:
+                        continue
+                    score = _cosine(vector, candidate_vector)
+                    if score >= best_score:
+                        best_key, best_score = candidate_key, score
+            value = self._get_exact(best_key, time.monotonic()) if best_key else None
+            if value is not None:
+                self._stats["semantic_hits"] += 1
+                return value
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, provider: str, model: str, messages: list[dict], value: str, params: dict | None = None) -> None:
+        params = params or {}
+        key = self.make_key(provider, model, messages, params)
+        vector = self._embed(messages) if self.semantic else None
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._vectors.pop(evicted, None)
+                self._stats["evictions"] += 1
+            if vector is not None:
+                self._vectors[key] = (self._scope(provider, model, params), vector)
+                self._vectors.move_to_end(key)
+                while len(self._vectors) > self.max_semantic_entries:
+                    self._vectors.popitem(last=False)
+
+    # The semantic tier makes a network call for embeddings; async callers must not run it on the loop
+    async def aget(self, provider: str, model: str, messages: list[dict], params: dict | None = None) -> str | None:
+        if not self.semantic:
+            return self.get(provider, model, messages, params)
+        return await asyncio.to_thread(self.get, provider, model, messages, params)
+
+    async def aset(self, provider: str, model: str, messages: list[dict], value: str, params: dict | None = None) -> None:
+        if not self.semantic:
+            return self.set(provider, model, messages, value, params)
+        await asyncio.to_thread(self.set, provider, model, messages, value, params)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["semantic_entries"] = len(self._vectors)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+# Shared instance used by openai_service, anthropic_client and the Gemini endpoint
+response_cache = ResponseCache.from_env()
@@ -0,0 +1,102 @@
+# services/retrieval_cache.py
+# In-process caches for LlamaService retrieval:
+#   embeddings - query embeddings keyed by (embedding model, normalized question),
+#                so a repeated question never goes back to the embeddings API
+#   retrievals - ranked hits keyed by (index version, normalized question, mode, top_k)
+# Retrieval entries carry the index version in their key and are dropped as
+# soon as LlamaService reports a new version, so a changed index is never
+# answered from stale hits. Embeddings do not depend on the index and survive.
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Trailing punctuation does not change what is being asked: "Who is Jane?" == "who is jane"
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.]+$")
+
+
+def normalize_question(question: str) -> str:
+    return _TRAILING_PUNCTUATION.sub("", " ".join(str(question).split()).casefold())
+
+
+class LRUCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._entries[key]
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+class RetrievalCache:
+    def __init__(self, max_embeddings: int = 2048, max_retrievals: int = 1024):
+        self.embeddings = LRUCache(max_embeddings)
+        self.retrievals = LRUCache(max_retrievals)
+        self.index_version: str | None = None
+
+    @classmethod
+    def from_env(cls) -> "RetrievalCache":
+        return cls(
+            max_embeddings=int(os.getenv("LLAMA_EMBEDDING_CACHE_SIZE", "2048")),
+            max_retrievals=int(os.getenv("LLAMA_RETRIEVAL_CACHE_SIZE", "1024")),
+        )
+
+    def set_index_version(self, version: str):
+        """Called whenever the index is (re)loaded; drops hits computed against another version."""
+        if version != self.index_version:
+            self.index_version = version
+            self.retrievals.clear()
+
+    def get_embedding(self, model: str, question: str) -> list[float] | None:
+        return self.embeddings.get((model, normalize_question(question)))
+
+    def set_embedding(self, model: str, question: str, embedding: list[float]):
+        self.embeddings.set((model, normalize_question(question)), embedding)
+
+    def get_hits(self, version: str, question: str, mode: str, top_k: int) -> list[dict] | None:
+        return self.retrievals.get((version, normalize_question(question), mode, top_k))
+
+    def set_hits(self, version: str, question: str, mode: str, top_k: int, hits: list[dict]):
+        # Skip hits computed against an index that has since been replaced
+        if version == self.index_version:
+            self.retrievals.set((version, normalize_question(question), mode, top_k), hits)
+
+    def stats(self) -> dict:
+        return {
+            "index_version": self.index_version,
+            "embeddings": self.embeddings.stats(),
+            "retrievals": self.retrievals.stats(),
+        }
+
+
+# Shared per-process cache; LlamaService's retriever reads and fills it
+retrieval_cache = RetrievalCache.from_env()
@@ -0,0 +1,141 @@
+# services/single_flight.py
+# Coalesce identical in-flight upstream requests: the first caller for a key
+# makes the call, concurrent callers with the same key wait for its result.
+# Streams are shared too: late joiners replay the chunks they missed from a
+# buffer, then follow the live stream.
+import asyncio
+import json
+import threading
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def flight_key(*parts) -> str:
+    """Key for a request: whitespace-insensitive, stable across dict ordering."""
+    return json.dumps(_normalize(list(parts)), sort_keys=True, default=str)
+
+
+class _SharedStream:
+    def __init__(self, stream_factory):
+        self.usage = {}
+        self.buffer: list = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self._changed = asyncio.Condition()
+        self.task = asyncio.create_task(self._pump(stream_factory(self.usage)))
+
+    async def _pump(self, source):
+        try:
+            async for chunk in source:
+                async with self._changed:
+                    self.buffer.append(chunk)
+                    self._changed.notify_all()
+        except asyncio.CancelledError:
+            # Subscribers still attached must not mistake the cut-off for a complete stream
+            self.error = RuntimeError("upstream stream cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            async with self._changed:
+                self.done = True
+                self._changed.notify_all()
+
+    async def subscribe(self, usage: dict | None = None):
+        position = 0
+        self.subscribers += 1
+        try:
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: position < len(self.buffer) or self.done)
+                    chunks = self.buffer[position:]
+                    position = len(self.buffer)
+                    finished = self.done
+                for chunk in chunks:
+                    yield chunk
+                if finished and position >= len(self.buffer):
+                    break
+        finally:
+            self.subscribers -= 1
+            # Everyone disconnected: stop paying for tokens nobody will read
+            if self.subscribers == 0 and not self.done:
+                self.task.cancel()
+        if self.error is not None:
+            raise self.error
+        if usage is not None:
+            usage.update(self.usage)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+        self._streams: dict[str, _SharedStream] = {}
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "coalesced": 0, "streams": 0, "stream_joiners": 0}
+
+    async def do(self, key: str, fn):
+        """
+        Await fn() (a coroutine function), sharing one call among concurrent callers with the same key.
+        The call runs as its own task, so one caller disconnecting does not cancel it for the others.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            self._count("calls")
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._forget(self._calls, key, t))
+        else:
+            self._count("coalesced")
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, stream_factory, usage: dict | None = None):
+        """
+        Iterate a shared stream. stream_factory(usage) must return an async iterator;
+        it is only called by the first subscriber for key. `usage` receives the
+        upstream's usage dict once the stream ends.
+        """
+        shared = self._streams.get(key)
+        if shared is None or shared.done:
+            self._count("streams")
+            shared = self._streams[key] = _SharedStream(stream_factory)
+            shared.task.add_done_callback(lambda t: self._forget(self._streams, key, shared))
+        else:
+            self._count("stream_joiners")
+        async for chunk in shared.subscribe(usage):
+            yield chunk
+
+    def streaming(self, key: str) -> bool:
+        """True if a shared stream for key is running (a new subscriber would join it)."""
+        shared = self._streams.get(key)
+        return shared is not None and not shared.done
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    @staticmethod
+    def _forget(registry: dict, key: str, value):
+        if registry.get(key) is value:
+            del registry[key]
+        if isinstance(value, asyncio.Task) and not value.cancelled():
+            value.exception()  # mark as retrieved; callers already received it
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls) + len(self._streams)
+        total = stats["calls"] + stats["coalesced"]
+        stats["coalesced_ratio"] = stats["coalesced"] / total if total else 0.0
+        return stats
+
+
+# Shared instance used by the provider helpers and streaming endpoints
+single_flight = SingleFlight()
@@ -0,0 +1,113 @@
+# services/voice_pipeline.py
+# Streaming voice replies: chat tokens are cut into sentences as they arrive,
+# each sentence is sent to TTS as soon as it is complete (several in flight at
+# once), and the audio is yielded strictly in sentence order. The first audio
+# is ready after STT + the first sentence instead of after the whole reply.
+import asyncio
+import io
+import os
+import re
+
+from .admission import admission
+from .metrics import track_upstream
+from .provider_clients import provider_clients
+
+STT_MODEL = os.getenv("VOICE_STT_MODEL", "whisper-1")
+TTS_MODEL = os.getenv("VOICE_TTS_MODEL", "tts-1")
+TTS_VOICE = os.getenv("VOICE_TTS_VOICE", "alloy")
+TTS_CONCURRENCY = int(os.getenv("VOICE_TTS_CONCURRENCY", "3"))
+# Short fragments ("Sure." "Hi!") are merged into the next sentence; the first
+# chunk uses a lower bar so playback starts as early as possible
+MIN_SENTENCE_CHARS = int(os.getenv("VOICE_MIN_SENTENCE_CHARS", "60"))
+FIRST_SENTENCE_CHARS = int(os.getenv("VOICE_FIRST_SENTENCE_CHARS", "20"))
+# Run-on text without sentence punctuation is cut at a clause/word boundary past this length
+MAX_SENTENCE_CHARS = 300
+
+# End of sentence: terminal punctuation (optionally closed by a quote/bracket) followed by whitespace
+SENTENCE_END_RE = re.compile(r"[.!?…](?:[\"')\]]*)\s+|\n{2,}")
+
+
+async def transcribe(audio_bytes: bytes, filename: str = "audio.webm") -> str:
+    audio_file = io.BytesIO(audio_bytes)
+    audio_file.name = filename
+    async with admission.slot("openai"):
+        with track_upstream("openai", STT_MODEL):
+            transcript = await provider_clients.openai.audio.transcriptions.create(model=STT_MODEL, file=audio_file)
+    return transcript.text
+
+
+async def synthesize(text: str) -> bytes:
+    """TTS for one piece of text, returned as MP3 bytes."""
+    async with admission.slot("openai"):
+        with track_upstream("openai", TTS_MODEL):
+            response = await provider_clients.openai.audio.speech.create(
+                model=TTS_MODEL, voice=TTS_VOICE, input=text, response_format="mp3"
+            )
+    return response.content
+
+
+async def split_sentences(tokens, min_chars: int = MIN_SENTENCE_CHARS, first_chars: int = FIRST_SENTENCE_CHARS):
+    """Regroup an async stream of text deltas into sentence-sized chunks."""
+    buffer = ""
+    emitted = False
+    async for token in tokens:
+        buffer += token
+        while True:
+            threshold = min_chars if emitted else first_chars
+            cut = None
+            for match in SENTENCE_END_RE.finditer(buffer):
+                if match.end() >= threshold:
+                    cut = match.end()
+                    break
+            if cut is None and len(buffer) > MAX_SENTENCE_CHARS:
+                comma, space = buffer.rfind(", ", 0, MAX_SENTENCE_CHARS), buffer.rfind(" ", 0, MAX_SENTENCE_CHARS)
+                cut = comma + 2 if comma > 0 else space + 1 if space > 0 else MAX_SENTENCE_CHARS
+            if cut is None:
+                break
+            sentence, buffer = buffer[:cut].strip(), buffer[cut:]
+            if sentence:
+                emitted = True
+                yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+
+async def speak(tokens, concurrency: int = TTS_CONCURRENCY):
+    """
+    Yield MP3 audio for a stream of chat tokens, one chunk per sentence, in order.
+    Up to `concurrency` sentences are synthesized at once.
+    MP3 frames concatenate cleanly, so the chunks can be played as one stream.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    # Bounded so a fast LLM cannot run far ahead of playback
+    pending: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def tts(sentence: str) -> bytes:
+        async with slots:
+            return await synthesize(sentence)
+
+    errors = []
+
+    async def produce():
+        try:
+            async for sentence in split_sentences(tokens):
+                await pending.put(asyncio.create_task(tts(sentence)))
+        except Exception as e:
+            errors.append(e)  # raised after the audio already queued has been played
+        await pending.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            task = await pending.get()
+            if task is None:
+                break
+            yield await task
+        if errors:
+            raise errors[0]
+    finally:
+        producer.cancel()
+        while not pending.empty():
+            task = pending.get_nowait()
+            if task is not None:
+                task.cancel()
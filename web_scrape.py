@@ -1,38 +1,41 @@
-import requests
-from bs4 import BeautifulSoup
-from openai import OpenAI
-from playwright.async_api import async_playwright
-
 import asyncio
+import time
+
+from services.admission import admission
+from services.browser_pool import browser_pool
+from services.content_reducer import reduce_html, reduce_html_with_length
+from services.extraction_cache import ExtractionCache
+from services.http_fetcher import fetcher
+from services.metrics import record_usage, track_upstream
+from services.provider_clients import provider_clients
 
-client = OpenAI()
+EXTRACTION_MODEL = "gpt-4.1"
+# Bump when the extraction prompt changes so cached extractions are not reused
+EXTRACTION_PROMPT_VERSION = "1"
+extraction_cache = ExtractionCache.from_env(f"{EXTRACTION_MODEL}:{EXTRACTION_PROMPT_VERSION}")
 
 # -----------------------------
-# Fetch static page text
+# Fetch static page text (pooled async client, per-host limits, conditional GET cache)
+# Pages are reduced to compact, token-budgeted text (see services/content_reducer.py)
 # -----------------------------
-def get_static_page_text(url: str) -> str:
+async def get_static_page_text(url: str) -> tuple[str, int]:
+    """Reduced page text and the length of its own content (without the added title/links/contact lines)."""
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "lxml")
-        paragraphs = [p.get_text() for p in soup.find_all("p")]
-        return "\n".join(paragraphs)
+        html = await fetcher.fetch(url)
+        return await asyncio.to_thread(reduce_html_with_length, html, url)
     except Exception as e:
-        return f"ERROR_FETCHING_STATIC_PAGE: {str(e)}"
+        return f"ERROR_FETCHING_STATIC_PAGE: {str(e)}", 0
 
 # -----------------------------
-# Fetch JS-heavy page text using async Playwright
+# Fetch JS-heavy page text using the shared Playwright browser pool
 # -----------------------------
 async def get_js_page_text_async(url: str) -> str:
     try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+        async with browser_pool.page() as page:
             await page.goto(url, timeout=20000)
             await page.wait_for_load_state("networkidle")
-            text = await page.inner_text("body")
-            await browser.close()
-            return text
+            html = await page.content()
+        return await asyncio.to_thread(reduce_html, html, url)
     except Exception as e:
         return f"ERROR_FETCHING_JS_PAGE: {str(e)}"
 
@@ -40,8 +43,9 @@ async def get_js_page_text_async(url: str) -> str:
 # Fetch page text: static first, fallback to JS
 # -----------------------------
 async def fetch_page_text(url: str) -> str:
-    text = get_static_page_text(url)
-    if text.startswith("ERROR") or len(text.strip()) < 100:
+    text, content_length = await get_static_page_text(url)
+    # Judged on the page's own text: JS shells still carry a title and links
+    if text.startswith("ERROR") or content_length < 100:
         text = await get_js_page_text_async(url)
     return text
 
@@ -54,13 +58,21 @@ async def scrape_single_url(url: str):
     if page_text.startswith("ERROR"):
         return {"url": url, "success": False, "error": page_text}
 
+    # Unchanged pages and near-duplicates (mirrors, tracking params) reuse an earlier extraction
+    cached, cache_kind = await asyncio.to_thread(extraction_cache.get, page_text)
+    if cached is not None:
+        return {"url": url, "success": True, "data": cached, "cache": cache_kind}
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {
-                    "role": "user",
-                    "content": f"""
+        # Async client: a per-URL deadline can cancel the call instead of blocking the loop
+        async with admission.slot("openai"):
+            with track_upstream("openai", EXTRACTION_MODEL):
+                response = await provider_clients.openai.chat.completions.create(
+                    model=EXTRACTION_MODEL,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": f"""
 You are a web data extractor.
 Here is the content of a webpage:
 
@@ -76,11 +88,14 @@ Please extract structured data:
 
 Return as JSON.
 """
-                }
-            ]
-        )
+                        }
+                    ]
+                )
+        if response.usage:
+            record_usage("openai", EXTRACTION_MODEL, response.usage.prompt_tokens, response.usage.completion_tokens)
 
         extracted_data = response.choices[0].message.content
+        await asyncio.to_thread(extraction_cache.set, page_text, extracted_data)
 
         return {"url": url, "success": True, "data": extracted_data}
 
@@ -94,3 +109,40 @@ async def scrape_multiple_urls(urls: list[str]):
     tasks = [scrape_single_url(url) for url in urls]
     results = await asyncio.gather(*tasks)
     return {"success": True, "count": len(results), "results": results}
+
+# -----------------------------
+# Scrape multiple URLs, yielding each result as soon as it completes
+# -----------------------------
+async def scrape_urls_stream(urls: list[str], deadline: float = 30.0, max_in_flight: int = 10):
+    """
+    Async generator of results in completion order. At most max_in_flight URLs are
+    scraped at once; a URL that exceeds its deadline (seconds) yields a timeout error.
+    Each result carries its input "index" and "elapsed_ms".
+    """
+    async def run(index: int, url: str):
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(scrape_single_url(url), timeout=deadline)
+        except asyncio.TimeoutError:
+            result = {"url": url, "success": False, "error": f"Timed out after {deadline}s"}
+        result["index"] = index
+        result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    queued = iter(enumerate(urls))
+    pending = set()
+    try:
+        while True:
+            for index, url in queued:
+                pending.add(asyncio.create_task(run(index, url)))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # Client went away (or the consumer stopped early): stop outstanding work
+        for task in pending:
+            task.cancel()